@@ -5,20 +5,30 @@ For more details about this integration, please refer to
 https://github.com/Relwarc17/hass_mars_hydro
 """
 
-from .coordinator import MarsHydroDataUpdateCoordinator
-from homeassistant.core import HomeAssistant
+from .coordinator import MarsHydroDataUpdateCoordinator, REDISCOVERY_INTERVAL
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core_config import Config
 from homeassistant.helpers.device_registry import DeviceEntry
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
 from homeassistant.exceptions import ConfigEntryNotReady
 
-from .const import DOMAIN
+from .const import CONF_MAX_CONCURRENT_REQUESTS
 from .const import CONF_PASSWORD
+from .const import CONF_REQUESTS_PER_SECOND
 from .const import CONF_USERNAME
+from .const import DEFAULT_MAX_CONCURRENT_REQUESTS
+from .const import DEFAULT_REQUESTS_PER_SECOND
 from .const import DOMAIN
 from .const import PLATFORMS
+from .const import SIGNAL_DEVICES_ADDED
 from .const import STARTUP_MESSAGE
+from .const import STORAGE_KEY_SNAPSHOT
+from .const import STORAGE_KEY_TOKEN
+from .const import STORAGE_VERSION
 
 import asyncio
 import logging
@@ -44,19 +54,36 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     _LOGGER.info("Creating session")
     session = async_get_clientsession(hass)
-    my_api = MarsHydroAPI(username, password, session)
+    token_store = Store(hass, STORAGE_VERSION, f"{STORAGE_KEY_TOKEN}.{entry.entry_id}")
+    my_api = MarsHydroAPI(
+        username,
+        password,
+        session,
+        token_store,
+        entry.options.get(CONF_REQUESTS_PER_SECOND, DEFAULT_REQUESTS_PER_SECOND),
+        entry.options.get(
+            CONF_MAX_CONCURRENT_REQUESTS, DEFAULT_MAX_CONCURRENT_REQUESTS
+        ),
+    )
+    entry.async_on_unload(my_api.close)
     
     # _LOGGER.info("Creating cordinator")
-    coordinator = MarsHydroDataUpdateCoordinator(hass, entry, my_api)
+    snapshot_store = Store(
+        hass, STORAGE_VERSION, f"{STORAGE_KEY_SNAPSHOT}.{entry.entry_id}"
+    )
+    coordinator = MarsHydroDataUpdateCoordinator(hass, entry, my_api, snapshot_store)
     # _LOGGER.info("Sync coordinator")
 
-    await coordinator.async_config_entry_first_refresh()
+    # Entities are built from the last saved state while the cloud catches up
+    restored = await coordinator.async_restore_snapshot()
+    if not restored:
+        await coordinator.async_config_entry_first_refresh()
     # await coordinator.async_refresh()
 
     _LOGGER.info('Devices in coordinator: %s', str(coordinator._devices))
     _LOGGER.info('Data in coordinator: %s', str(coordinator.data))
 
-    if not coordinator.last_update_success:
+    if not restored and not coordinator.last_update_success:
         _LOGGER.error("Error synchronizing coordinator")
         raise ConfigEntryNotReady
 
@@ -64,8 +91,38 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     _LOGGER.info("Setting entries up")
     
-    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
-    #entry.add_update_listener(async_reload_entry)
+    await _async_forward_platforms(hass, entry, coordinator)
+    # Entities are built from coordinator data, platforms add no requests
+    _LOGGER.info(
+        "Set up %d devices with %d API requests",
+        len(coordinator._devices),
+        my_api.request_count,
+    )
+
+    @callback
+    def _async_devices_added(_devices):
+        entry.async_create_task(
+            hass, _async_forward_platforms(hass, entry, coordinator, late=True)
+        )
+
+    entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, SIGNAL_DEVICES_ADDED.format(entry.entry_id), _async_devices_added
+        )
+    )
+    entry.async_on_unload(
+        async_track_time_interval(
+            hass, coordinator.async_rediscover_devices, REDISCOVERY_INTERVAL
+        )
+    )
+    if restored:
+        entry.async_create_background_task(
+            hass,
+            coordinator.async_reconcile_snapshot(),
+            f"{DOMAIN} reconcile {entry.entry_id}",
+        )
+    # Request limits and poll intervals are read on setup, apply new options
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
     return True
 
     devices = await api.get_devices()
@@ -82,15 +139,40 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     return True
 
 
+async def _async_forward_platforms(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    coordinator: MarsHydroDataUpdateCoordinator,
+    late: bool = False,
+) -> None:
+    """Set up the enabled platforms that have devices and are not loaded yet."""
+    required = coordinator.required_platforms()
+    platforms = [
+        platform
+        for platform in PLATFORMS
+        if platform in required
+        and entry.options.get(platform, True)
+        and platform not in coordinator._platforms
+    ]
+    if not platforms:
+        return
+    _LOGGER.info("Setting up platforms %s", platforms)
+    # Claimed before awaiting so concurrent calls do not load a platform twice
+    coordinator._platforms.extend(platforms)
+    if late:
+        await hass.config_entries.async_late_forward_entry_setups(entry, platforms)
+    else:
+        await hass.config_entries.async_forward_entry_setups(entry, platforms)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Handle removal of an entry."""
-    #coordinator = hass.data[DOMAIN][entry.entry_id]
+    coordinator = hass.data[DOMAIN][entry.entry_id]
     unloaded = all(
         await asyncio.gather(
             *[
                 hass.config_entries.async_forward_entry_unload(entry, platform)
-                for platform in PLATFORMS
-                #if platform in coordinator._platforms
+                for platform in coordinator._platforms
             ]
         )
     )
@@ -102,8 +184,7 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
 async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Reload config entry."""
-    await async_unload_entry(hass, entry)
-    await async_setup_entry(hass, entry)
+    await hass.config_entries.async_reload(entry.entry_id)
 
 async def async_remove_config_entry_device(
     hass: HomeAssistant, config_entry: ConfigEntry, device_entry: DeviceEntry
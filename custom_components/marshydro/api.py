@@ -1,54 +1,125 @@
+from collections.abc import AsyncIterator
 import aiohttp
 import json
+import math
 import time
 import logging
 import socket
 import asyncio
 import async_timeout
+from types import MappingProxyType
 
+from .auth import MarsHydroTokenManager
 from .mars_device import MarsHydroDevice, MarsHydroDevices
+from .const import DEFAULT_MAX_CONCURRENT_REQUESTS
+from .const import DEFAULT_REQUESTS_PER_SECOND
+from .rate_limit import (
+    PRIORITY_COMMAND,
+    PRIORITY_POLL,
+    RateLimiter,
+    RequestScheduler,
+)
+from .retry import COMMAND_POLICY, READ_POLICY, CircuitBreaker, RetryPolicy
 
 
 TIMEOUT = 30
+LOGIN_PATH = "/ulogin/mailLogin/v1"
+# Device list pages fetched at once after the first page reported a total
+DEVICE_PAGE_CONCURRENCY = 4
+MAX_DEVICE_PAGES = 100
+# Burst size of the rate limiter, in seconds worth of the request budget
+RATE_LIMIT_BURST_SECONDS = 2
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
-HEADERS = {
+HEADERS = MappingProxyType({
     "Content-type": "application/json; charset=UTF-8",
     "User-Agent": "Python/3.x",
     "Accept-Encoding": "gzip",
     "Host": "api.lgledsolutions.com",
-}
+})
+
+# Fields of systemData that never change, serialised once per client
+SYSTEM_DATA = MappingProxyType({
+    "appVersion": "1.2.0",
+    "osType": "android",
+    "osVersion": "14",
+    "deviceType": "SM-S928C",
+    "netType": "wifi",
+    "wifiName": "123",
+    "timezone": "Europe/Berlin",
+    "language": "German",
+})
+
+
+class MarsHydroApiError(Exception):
+    """Request to the Mars Hydro cloud failed."""
+
+
+class MarsHydroAuthError(MarsHydroApiError):
+    """The Mars Hydro cloud rejected the credentials."""
+
+
+class MarsHydroCircuitOpenError(MarsHydroApiError):
+    """Requests are paused after repeated failures."""
 
 
 class MarsHydroAPI:
     def __init__(
-        self, username: str, password: str, session: aiohttp.ClientSession
+        self,
+        username: str,
+        password: str,
+        session: aiohttp.ClientSession,
+        token_store=None,
+        requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+        max_in_flight: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
     ) -> None:
         """Sample API Client."""
         self._username = username
         self._password = password
         self._session = session
-        self._token = None
-        self._last_login_time = None
-        self._login_interval = 300 
+        self._tokens = MarsHydroTokenManager(self._async_login, token_store)
         self._base_url = "https://api.lgledsolutions.com/api/android"
+        self._pending_device_data: dict[int, asyncio.Future] = {}
+        self._breaker = CircuitBreaker()
+        self._scheduler = RequestScheduler(
+            max_in_flight,
+            RateLimiter(
+                requests_per_second,
+                round(requests_per_second * RATE_LIMIT_BURST_SECONDS),
+            ),
+        )
+        self._headers = HEADERS
+        self._static_system_data = json.dumps(dict(SYSTEM_DATA))[1:-1]
+        self._request_count = 0
+
+    @property
+    def _token(self) -> str | None:
+        return self._tokens.token
+
+    @property
+    def request_count(self) -> int:
+        """Return how many HTTP requests this client has sent, retries included."""
+        return self._request_count
 
     async def _ensure_token(self):
         """Ensure that the token is valid."""
-        if not self._token:
-            await self.login()
+        await self._tokens.async_get_token()
 
+    def close(self) -> None:
+        """Stop background token maintenance."""
+        self._tokens.close()
 
     async def login(self) -> bool:
         """Authenticate and retrieve the token."""
-        now = time.time()
-        if self._token and (now - self._last_login_time < self._login_interval):
-            _LOGGER.info("Token still valid, skipping login.")
-            return True
-
-        HEADERS["systemData"] = self._generate_system_data()
+        try:
+            return await self._tokens.async_get_token() is not None
+        except MarsHydroApiError as exception:
+            _LOGGER.error("Login failed - %s", exception)
+            return False
 
+    async def _async_login(self) -> str | None:
+        """Log in with the account credentials and return the new token."""
         #_LOGGER.error("Enter API login method")
         login_data = {
             "email": self._username,
@@ -56,76 +127,157 @@ class MarsHydroAPI:
             "loginMethod": "1"
         }
 
-        url = f"{self._base_url}/ulogin/mailLogin/v1"
-        response = await self.api_wrapper("post", url, data=login_data, headers=HEADERS)
+        url = f"{self._base_url}{LOGIN_PATH}"
+        # Every other request waits for the token, so log in first
+        response = await self.api_wrapper(
+            "post", url, data=login_data, priority=PRIORITY_COMMAND
+        )
         if not response:
-            return False
+            return None
         #_LOGGER.error(f"Response in login: {response}")
-        self._token = response["token"]
-        self._last_login_time = now
-        _LOGGER.info(f"Login erfolgreich, Token erhalten: {self._token}")
-        return True
+        _LOGGER.info("Login erfolgreich, Token erhalten")
+        return response["token"]
 
-    async def async_get_devices(self) -> MarsHydroDevice | list:
-        await self._ensure_token()
+    async def async_get_devices(self) -> list[MarsHydroDevice]:
+        """Return every device on the account."""
+        return [device async for device in self.async_iter_devices()]
 
-        HEADERS["systemData"] = self._generate_system_data()
-        json_body = {"currentPage": 0}
+    async def async_iter_devices(self) -> AsyncIterator[MarsHydroDevice]:
+        """Yield every device on the account as its page arrives.
 
+        When the first page reports a total, the remaining pages are fetched
+        concurrently. Without one, or when the total is not reached yet,
+        pages are walked one by one until no new device shows up.
+        """
+        await self._ensure_token()
+
+        seen = set()
+        response = await self._async_get_device_page(0)
+        devices = response.get("list") or []
+        for device in self._unseen_devices(devices, seen):
+            yield device
+
+        page_size = len(devices)
+        total = response.get("total")
+        next_page = 1
+        if isinstance(total, int) and page_size and total > page_size:
+            last_page = math.ceil(total / page_size)
+            semaphore = asyncio.Semaphore(DEVICE_PAGE_CONCURRENCY)
+
+            async def fetch(page):
+                async with semaphore:
+                    return await self._async_get_device_page(page)
+
+            tasks = [asyncio.ensure_future(fetch(page)) for page in range(1, last_page)]
+            try:
+                for next_response in asyncio.as_completed(tasks):
+                    page_response = await next_response
+                    for device in self._unseen_devices(page_response.get("list") or [], seen):
+                        yield device
+            finally:
+                for task in tasks:
+                    task.cancel()
+            next_page = last_page
+
+        while (
+            page_size
+            and (not isinstance(total, int) or len(seen) < total)
+            and next_page < MAX_DEVICE_PAGES
+        ):
+            response = await self._async_get_device_page(next_page)
+            devices = list(self._unseen_devices(response.get("list") or [], seen))
+            # Page 1 may repeat page 0 when the server counts pages from 1
+            if not devices and (next_page > 1 or not response.get("list")):
+                break
+            for device in devices:
+                yield device
+            next_page += 1
+
+    async def _async_get_device_page(self, page: int) -> dict:
         url = f"{self._base_url}/udm/getDeviceList/v1"
-        response = await self.api_wrapper("post", url, data=json_body, headers=HEADERS)
-        
-        
-        return response["list"]
-        
-        #device_list = {}
-        #for device in response.get("list", []):
-        #    prod_type = device["productType"]
-        #    device_list[prod_type] = device
+        response = await self.api_wrapper("post", url, data={"currentPage": page})
+        if not isinstance(response, dict):
+            # Treating this as an empty page would look like removed devices
+            raise MarsHydroApiError(f"Device list page {page} returned no data")
+        return response
 
-        #return device_list
+    @staticmethod
+    def _unseen_devices(devices, seen: set):
+        for device in devices:
+            if device["id"] not in seen:
+                seen.add(device["id"])
+                yield device
 
+    async def async_set_device_p(self, brightness, device_id, group_id=None) -> None:
+        """Set the brightness of the Mars Hydro light.
 
-    async def async_set_device_p(self, brightness, device_id) -> None:
-        """Set the brightness of the Mars Hydro light."""
+        Pass ``group_id`` instead of ``device_id`` to address a whole group.
+        """
         await self._ensure_token()
 
-        HEADERS["systemData"] = self._generate_system_data()
-
         url = f"{self._base_url}/udm/adjustLight/v1"
 
         json_body = {
             "light": brightness,
             "deviceId": device_id,
-            "groupId": None,
+            "groupId": group_id,
         }
 
-        response = await self.api_wrapper("post", url, data=json_body, headers=HEADERS)
+        response = await self.api_wrapper(
+            "post",
+            url,
+            data=json_body,
+            policy=COMMAND_POLICY,
+            priority=PRIORITY_COMMAND,
+        )
         _LOGGER.info(response)
         
 
-    async def toggle_switch(self, is_close: bool, device_id: str):
-        """Toggle the light or fan switch (on/off)."""
-        await self._ensure_token()
+    async def toggle_switch(self, is_close: bool, device_id: str, group_id=None):
+        """Toggle the light or fan switch (on/off).
 
-        HEADERS["systemData"] = self._generate_system_data()
+        Pass ``group_id`` instead of ``device_id`` to address a whole group.
+        """
+        await self._ensure_token()
 
         url = f"{self._base_url}/udm/lampSwitch/v1"
 
         json_body = {
             "isClose": is_close,
             "deviceId": device_id,
-            "groupId": None,
+            "groupId": group_id,
         }
 
-        response = await self.api_wrapper("post", url, data=json_body, headers=HEADERS)
+        response = await self.api_wrapper(
+            "post",
+            url,
+            data=json_body,
+            policy=COMMAND_POLICY,
+            priority=PRIORITY_COMMAND,
+        )
         _LOGGER.info(response)
 
-    async def async_get_device_data(self, device_id) -> MarsHydroDevice:
-        """Get detailed info on the device"""
-        await self._ensure_token()
+    async def async_get_device_data(
+        self, device_id, priority: int = PRIORITY_POLL
+    ) -> MarsHydroDevice:
+        """Get detailed info on the device.
+
+        Concurrent callers asking for the same device share one in-flight
+        request and its result.
+        """
+        pending = self._pending_device_data.get(device_id)
+        if pending is None:
+            pending = asyncio.ensure_future(
+                self._fetch_device_data(device_id, priority)
+            )
+            self._pending_device_data[device_id] = pending
+            pending.add_done_callback(
+                lambda _: self._pending_device_data.pop(device_id, None)
+            )
+        return await asyncio.shield(pending)
 
-        HEADERS["systemData"] = self._generate_system_data()
+    async def _fetch_device_data(self, device_id, priority: int) -> MarsHydroDevice:
+        await self._ensure_token()
 
         url = f"{self._base_url}/udm/getDeviceDetail/v1"
 
@@ -133,83 +285,119 @@ class MarsHydroAPI:
             "deviceId": device_id,
         }
 
-        response = await self.api_wrapper("post", url, data=json_body, headers=HEADERS)
+        response = await self.api_wrapper(
+            "post", url, data=json_body, priority=priority
+        )
+        if not isinstance(response, dict):
+            raise MarsHydroApiError(f"Device {device_id} details returned no data")
         return response
 
-    def _generate_system_data(self, device_id=None):
-        """Generate systemData payload with dynamic device_id."""
+    def _generate_system_data(self, token: str | None = None, device_id=None) -> str:
+        """Generate systemData payload with the per-request fields filled in."""
         now_time = int(time.time())
-        system_data = {
-            "reqId": now_time * 1000,
-            "appVersion": "1.2.0",
-            "osType": "android",
-            "osVersion": "14",
-            "deviceType": "SM-S928C",
-            "netType": "wifi",
-            "wifiName": "123",
-            "timestamp": now_time,
-            "timezone": "Europe/Berlin",
-            "language": "German"
-        }
+        fields = [f'"reqId": {now_time * 1000}', self._static_system_data]
+        fields.append(f'"timestamp": {now_time}')
         if device_id:
-            system_data["deviceId"] = device_id
-        if self._token:
-            system_data["token"] = self._token
-        return json.dumps(system_data)
-    
+            fields.append(f'"deviceId": {json.dumps(device_id)}')
+        if token:
+            fields.append(f'"token": {json.dumps(token)}')
+        return "{" + ", ".join(fields) + "}"
+
+    def _build_headers(self, token: str | None) -> dict:
+        """Return a fresh header dict for one request."""
+        headers = dict(self._headers)
+        headers["systemData"] = self._generate_system_data(token)
+        return headers
 
     async def api_wrapper(
-        self, method: str, url: str, data: dict = {}, headers: dict = {}
+        self,
+        method: str,
+        url: str,
+        data: dict = {},
+        policy: RetryPolicy = READ_POLICY,
+        priority: int = PRIORITY_POLL,
     ) -> dict:
-        """Get information from the API."""
-        try:
-            async with async_timeout.timeout(TIMEOUT):
-                
-                if method == "get":
-                    response = await self._session.get(url, params=data, headers=headers)#, ssl=False, proxy="http://192.168.178.62:8080")
-
-                elif method == "put":
-                    response = await self._session.put(url, headers=headers, json=data)#, ssl=False, proxy="http://192.168.178.62:8080")
-
-                elif method == "patch":
-                    response = await self._session.patch(url, headers=headers, json=data)#, ssl=False, proxy="http://192.168.178.62:8080")
-
-                elif method == "post":
-                    response = await self._session.post(url, headers=headers, json=data)#, ssl=False, proxy="http://192.168.178.62:8080")
-                json_response = await response.json()
-                #_LOGGER.error("HTTP Response json: %s", json_response)
-
-                if json_response["code"] == "000" and "data" in json_response:
-                    return json_response["data"]
-                
-                if json_response["code"] == "100":
-                    _LOGGER.error("Error logging in: %s",json_response["msg"])
-                    raise aiohttp.ClientError
-                
-                if json_response["code"] == "102":
+        """Get information from the API.
+
+        Failed requests are retried according to ``policy`` with jittered
+        exponential backoff. Raises MarsHydroApiError once retries are used up
+        or while the circuit breaker is open. Every attempt first takes a
+        slot from the account-wide request scheduler at ``priority``.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            if not self._breaker.allow_request():
+                raise MarsHydroCircuitOpenError(
+                    f"Mars Hydro cloud unavailable, not requesting {url}"
+                )
+
+            token = self._token
+            try:
+                async with self._scheduler.async_slot(priority):
+                    json_response = await self._request(
+                        method, url, data, self._build_headers(token)
+                    )
+            except asyncio.TimeoutError as exception:
+                self._breaker.record_failure()
+                _LOGGER.warning(
+                    "Timeout error fetching information from %s (attempt %d)",
+                    url,
+                    attempt,
+                )
+                if not policy.retry_timeouts or attempt >= policy.attempts:
+                    raise MarsHydroApiError(f"Timeout requesting {url}") from exception
+            except (aiohttp.ClientError, socket.gaierror) as exception:
+                self._breaker.record_failure()
+                _LOGGER.warning(
+                    "Error fetching information from %s (attempt %d) - %s",
+                    url,
+                    attempt,
+                    exception,
+                )
+                if attempt >= policy.attempts:
+                    raise MarsHydroApiError(f"Error requesting {url}: {exception}") from exception
+            else:
+                self._breaker.record_success()
+                if not isinstance(json_response, dict):
+                    raise MarsHydroApiError(f"Unexpected response from {url}")
+
+                code = json_response.get("code")
+                if code == "000":
+                    return json_response.get("data")
+
+                if code == "100":
+                    _LOGGER.error("Error logging in: %s", json_response.get("msg"))
+                    raise MarsHydroAuthError(json_response.get("msg"))
+
+                if (
+                    code == "102"
+                    and not url.endswith(LOGIN_PATH)
+                    and attempt < policy.attempts
+                ):
+                    # The server rejected the request, so repeating it is safe
                     _LOGGER.error("Token expired, re-authenticating...")
-                    await self.login()
-                    self.api_wrapper(method, url, data, headers)
-        
-                _LOGGER.error("result not in esponse.")
-        except asyncio.TimeoutError as exception:
-            _LOGGER.error(
-                "Timeout error fetching information from %s - %s",
-                url,
-                exception,
-            )
+                    await self._tokens.async_refresh(stale_token=token)
+                    continue
 
-        except (KeyError, TypeError) as exception:
-            _LOGGER.error(
-                "Error parsing information from %s - %s",
-                url,
-                exception,
-            )
-        except (aiohttp.ClientError, socket.gaierror) as exception:
-            _LOGGER.error(
-                "Error fetching information from %s - %s",
-                url,
-                exception,
-            )
-        except Exception as exception:  # pylint: disable=broad-except
-            _LOGGER.error("Something really wrong happened! - %s", exception)
+                raise MarsHydroApiError(
+                    f"Request to {url} failed with code {code}: {json_response.get('msg')}"
+                )
+
+            await asyncio.sleep(policy.backoff(attempt))
+
+    async def _request(self, method: str, url: str, data: dict, headers: dict):
+        self._request_count += 1
+        async with async_timeout.timeout(TIMEOUT):
+            if method == "get":
+                response = await self._session.get(url, params=data, headers=headers)#, ssl=False, proxy="http://192.168.178.62:8080")
+
+            elif method == "put":
+                response = await self._session.put(url, headers=headers, json=data)#, ssl=False, proxy="http://192.168.178.62:8080")
+
+            elif method == "patch":
+                response = await self._session.patch(url, headers=headers, json=data)#, ssl=False, proxy="http://192.168.178.62:8080")
+
+            elif method == "post":
+                response = await self._session.post(url, headers=headers, json=data)#, ssl=False, proxy="http://192.168.178.62:8080")
+            return await response.json()
@@ -0,0 +1,131 @@
+"""Token lifecycle handling for the Mars Hydro cloud API."""
+
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
+import asyncio
+import logging
+import time
+
+# The cloud does not report an expiry, so assume a conservative lifetime.
+# An early expiry is still caught by the API answering with code 102.
+TOKEN_LIFETIME = timedelta(hours=12)
+TOKEN_REFRESH_MARGIN = timedelta(minutes=10)
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+
+class MarsHydroTokenManager:
+    """Keep a single valid token for an account.
+
+    Logins are serialised behind a lock, the token is refreshed in the
+    background before it expires and, when a store is given, persisted so a
+    restart can reuse it.
+    """
+
+    def __init__(
+        self,
+        login_func: Callable[[], Awaitable[str | None]],
+        store=None,
+        lifetime: timedelta = TOKEN_LIFETIME,
+        refresh_margin: timedelta = TOKEN_REFRESH_MARGIN,
+    ) -> None:
+        self._login_func = login_func
+        self._store = store
+        self._lifetime = lifetime.total_seconds()
+        self._refresh_margin = refresh_margin.total_seconds()
+        self._lock = asyncio.Lock()
+        self._token: str | None = None
+        self._expires_at: float = 0.0
+        self._loaded = store is None
+        self._refresh_task: asyncio.Task | None = None
+
+    @property
+    def token(self) -> str | None:
+        return self._token
+
+    @property
+    def is_valid(self) -> bool:
+        return self._token is not None and time.time() < self._expires_at
+
+    async def async_get_token(self) -> str | None:
+        """Return a valid token, logging in only when needed."""
+        if not self._loaded:
+            await self._async_load()
+        if self.is_valid:
+            return self._token
+        return await self.async_refresh()
+
+    async def async_refresh(
+        self, stale_token: str | None = None, force: bool = False
+    ) -> str | None:
+        """Log in again unless another caller already did.
+
+        Pass the token a request was rejected with as ``stale_token`` so
+        callers that raced on the same expiry share one login.
+        """
+        async with self._lock:
+            if (
+                not force
+                and self.is_valid
+                and (stale_token is None or self._token != stale_token)
+            ):
+                _LOGGER.info("Token still valid, skipping login.")
+                return self._token
+
+            token = await self._login_func()
+            if not token:
+                return None
+
+            self._token = token
+            self._expires_at = time.time() + self._lifetime
+            await self._async_save()
+            self._schedule_refresh()
+            return token
+
+    def close(self) -> None:
+        """Stop the background refresh."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    async def _async_load(self) -> None:
+        async with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            data = await self._store.async_load()
+            if not data or data.get("expires_at", 0) <= time.time():
+                return
+            self._token = data["token"]
+            self._expires_at = data["expires_at"]
+            _LOGGER.info("Restored token from storage")
+            self._schedule_refresh()
+
+    async def _async_save(self) -> None:
+        if self._store is None:
+            return
+        await self._store.async_save(
+            {"token": self._token, "expires_at": self._expires_at}
+        )
+
+    def _schedule_refresh(self) -> None:
+        if (
+            self._refresh_task is not None
+            and self._refresh_task is not asyncio.current_task()
+        ):
+            self._refresh_task.cancel()
+        delay = max(self._expires_at - self._refresh_margin - time.time(), 0)
+        self._refresh_task = asyncio.get_running_loop().create_task(
+            self._async_refresh_later(delay)
+        )
+
+    async def _async_refresh_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        _LOGGER.info("Refreshing token before it expires")
+        try:
+            token = await self.async_refresh(force=True)
+        except Exception as exception:  # pylint: disable=broad-except
+            _LOGGER.error("Proactive token refresh failed - %s", exception)
+            return
+        if token is None:
+            _LOGGER.error("Proactive token refresh failed")
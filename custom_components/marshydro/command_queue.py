@@ -0,0 +1,72 @@
+"""Per-device coalescing of set-point commands."""
+
+from datetime import timedelta
+import asyncio
+import logging
+
+# Commands for a device arriving within this window collapse into the last one
+COMMAND_DEBOUNCE = timedelta(milliseconds=400)
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+
+class CommandQueue:
+    """Last-write-wins queue for set-point commands.
+
+    Each device gets one worker that waits ``delay``, sends only the newest
+    submitted command and resolves every caller it superseded with the same
+    outcome. Commands for one device are sent strictly in order, different
+    devices are handled concurrently.
+    """
+
+    def __init__(self, delay: timedelta = COMMAND_DEBOUNCE) -> None:
+        self._delay = delay.total_seconds()
+        # device id -> (command, args, futures of every coalesced caller)
+        self._latest: dict[int, tuple] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+
+    async def async_submit(self, device_id, command, *args):
+        """Queue a command and wait until it or a newer one was sent."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiters = self._latest[device_id][2] if device_id in self._latest else []
+        self._latest[device_id] = (command, args, [*waiters, future])
+        if device_id not in self._workers:
+            self._workers[device_id] = loop.create_task(self._async_run(device_id))
+        return await future
+
+    def close(self) -> None:
+        """Cancel the workers and every caller still waiting on them."""
+        for worker in self._workers.values():
+            worker.cancel()
+        for _, _, waiters in self._latest.values():
+            for waiter in waiters:
+                waiter.cancel()
+        self._workers.clear()
+        self._latest.clear()
+
+    async def _async_run(self, device_id) -> None:
+        try:
+            while device_id in self._latest:
+                await asyncio.sleep(self._delay)
+                command, args, waiters = self._latest.pop(device_id)
+                if len(waiters) > 1:
+                    _LOGGER.debug(
+                        "Coalesced %d commands for device %s", len(waiters), device_id
+                    )
+                try:
+                    result = await command(*args)
+                except asyncio.CancelledError:
+                    for waiter in waiters:
+                        waiter.cancel()
+                    raise
+                except Exception as err:  # pylint: disable=broad-except
+                    for waiter in waiters:
+                        if not waiter.done():
+                            waiter.set_exception(err)
+                else:
+                    for waiter in waiters:
+                        if not waiter.done():
+                            waiter.set_result(result)
+        finally:
+            self._workers.pop(device_id, None)
@@ -8,8 +8,20 @@ import voluptuous as vol
 
 from .api import MarsHydroAPI
 import logging
+from .const import CONF_LIGHT_SCAN_INTERVAL
+from .const import CONF_MAX_CONCURRENT_REQUESTS
+from .const import CONF_MAX_SCAN_INTERVAL
+from .const import CONF_MIN_SCAN_INTERVAL
 from .const import CONF_PASSWORD
+from .const import CONF_REQUESTS_PER_SECOND
 from .const import CONF_USERNAME
+from .const import CONF_WIND_SCAN_INTERVAL
+from .const import DEFAULT_LIGHT_SCAN_INTERVAL
+from .const import DEFAULT_MAX_CONCURRENT_REQUESTS
+from .const import DEFAULT_MAX_SCAN_INTERVAL
+from .const import DEFAULT_MIN_SCAN_INTERVAL
+from .const import DEFAULT_REQUESTS_PER_SECOND
+from .const import DEFAULT_WIND_SCAN_INTERVAL
 from .const import DOMAIN
 from .const import NAME
 from .const import PLATFORMS
@@ -61,6 +73,9 @@ class MarsHydroFlowHandler(ConfigFlow, domain=DOMAIN):
             return await api.login()
         except ConfigEntryAuthFailed:
             return False
+        finally:
+            # Stops the background token refresh of the throwaway client
+            api.close()
         #try:
         #    _LOGGER.error("Inside _test_credentials before login")
         #    await api.login()
@@ -105,21 +120,68 @@ class MarsHydroOptionsFlowHandler(OptionsFlow):
     async def async_step_user(self, user_input=None):
         """Handle a flow initialized by the user."""
         if user_input is not None:
-            self.options.update(user_input)
-            return await self._update_options()
+            return await self._update_options(user_input)
+
+        schema = {
+            vol.Required(x, default=self.options.get(x, True)): bool
+            for x in sorted(PLATFORMS)
+        }
+        schema[
+            vol.Required(
+                CONF_MAX_CONCURRENT_REQUESTS,
+                default=self.options.get(
+                    CONF_MAX_CONCURRENT_REQUESTS, DEFAULT_MAX_CONCURRENT_REQUESTS
+                ),
+            )
+        ] = vol.All(vol.Coerce(int), vol.Range(min=1, max=50))
+        schema[
+            vol.Required(
+                CONF_MIN_SCAN_INTERVAL,
+                default=self.options.get(
+                    CONF_MIN_SCAN_INTERVAL, DEFAULT_MIN_SCAN_INTERVAL
+                ),
+            )
+        ] = vol.All(vol.Coerce(int), vol.Range(min=5, max=3600))
+        schema[
+            vol.Required(
+                CONF_MAX_SCAN_INTERVAL,
+                default=self.options.get(
+                    CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL
+                ),
+            )
+        ] = vol.All(vol.Coerce(int), vol.Range(min=5, max=86400))
+        schema[
+            vol.Required(
+                CONF_WIND_SCAN_INTERVAL,
+                default=self.options.get(
+                    CONF_WIND_SCAN_INTERVAL, DEFAULT_WIND_SCAN_INTERVAL
+                ),
+            )
+        ] = vol.All(vol.Coerce(int), vol.Range(min=5, max=3600))
+        schema[
+            vol.Required(
+                CONF_LIGHT_SCAN_INTERVAL,
+                default=self.options.get(
+                    CONF_LIGHT_SCAN_INTERVAL, DEFAULT_LIGHT_SCAN_INTERVAL
+                ),
+            )
+        ] = vol.All(vol.Coerce(int), vol.Range(min=5, max=3600))
+        schema[
+            vol.Required(
+                CONF_REQUESTS_PER_SECOND,
+                default=self.options.get(
+                    CONF_REQUESTS_PER_SECOND, DEFAULT_REQUESTS_PER_SECOND
+                ),
+            )
+        ] = vol.All(vol.Coerce(float), vol.Range(min=0.1, max=50))
 
         return self.async_show_form(
             step_id = "user",
-            data_schema = vol.Schema(
-                {
-                    vol.Required(x, default=self.options.get(x, True)): bool
-                    for x in sorted(PLATFORMS)
-                }
-            ),
+            data_schema = vol.Schema(schema),
         )
 
-    async def _update_options(self):
+    async def _update_options(self, user_input):
         """Update config entry options."""
         return self.async_create_entry(
-            title=NAME, data=self.options
+            title=NAME, data={**self.options, **user_input}
         )
\ No newline at end of file
@@ -20,14 +20,40 @@ LIGHT = "light"
 FAN = "fan"
 #PLATFORMS = [SENSOR, SWITCH, FAN, LIGHT]
 PLATFORMS = [LIGHT, FAN, SENSOR]
+# Platforms that create entities for each product type
+PLATFORMS_BY_PRODUCT_TYPE = {
+    "LIGHT": [LIGHT],
+    "WIND": [FAN, SENSOR],
+}
+
+# Dispatcher signals, formatted with the config entry id
+SIGNAL_DEVICES_ADDED = f"{DOMAIN}_devices_added_{{}}"
+SIGNAL_DEVICES_REMOVED = f"{DOMAIN}_devices_removed_{{}}"
 
 # Configuration and options
 CONF_ENABLED = "enabled"
 CONF_USERNAME = "username"
 CONF_PASSWORD = "password"
+CONF_MAX_CONCURRENT_REQUESTS = "max_concurrent_requests"
+CONF_MIN_SCAN_INTERVAL = "min_scan_interval"
+CONF_MAX_SCAN_INTERVAL = "max_scan_interval"
+CONF_REQUESTS_PER_SECOND = "requests_per_second"
+CONF_WIND_SCAN_INTERVAL = "wind_scan_interval"
+CONF_LIGHT_SCAN_INTERVAL = "light_scan_interval"
+
+# Storage
+STORAGE_VERSION = 1
+STORAGE_KEY_TOKEN = f"{DOMAIN}.token"
+STORAGE_KEY_SNAPSHOT = f"{DOMAIN}.snapshot"
 
 # Defaults
 DEFAULT_NAME = DOMAIN
+DEFAULT_MAX_CONCURRENT_REQUESTS = 5
+DEFAULT_MIN_SCAN_INTERVAL = 15
+DEFAULT_MAX_SCAN_INTERVAL = 600
+DEFAULT_REQUESTS_PER_SECOND = 5
+DEFAULT_WIND_SCAN_INTERVAL = 15
+DEFAULT_LIGHT_SCAN_INTERVAL = 60
 
 
 STARTUP_MESSAGE = f"""
@@ -1,11 +1,21 @@
 """Example integration using DataUpdateCoordinator."""
 
 from datetime import timedelta
+import asyncio
 import logging
+import time
 
 
-from .mars_device import MarsHydroDevice, MarsHydroDevices
+from dataclasses import asdict, replace
+
+from .mars_device import (
+    MarsHydroDevice,
+    MarsHydroDevices,
+    MarsHydroDeviceState,
+    STATE_FIELDS,
+)
 from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
 from homeassistant.exceptions import ConfigEntryAuthFailed
 from homeassistant.helpers.update_coordinator import (
     CoordinatorEntity,
@@ -13,17 +23,70 @@ from homeassistant.helpers.update_coordinator import (
     UpdateFailed,
 )
 
+from .const import CONF_LIGHT_SCAN_INTERVAL
+from .const import CONF_MAX_CONCURRENT_REQUESTS
+from .const import CONF_MAX_SCAN_INTERVAL
+from .const import CONF_MIN_SCAN_INTERVAL
+from .const import CONF_WIND_SCAN_INTERVAL
+from .const import DEFAULT_LIGHT_SCAN_INTERVAL
+from .const import DEFAULT_MAX_CONCURRENT_REQUESTS
+from .const import DEFAULT_MAX_SCAN_INTERVAL
+from .const import DEFAULT_MIN_SCAN_INTERVAL
+from .const import DEFAULT_WIND_SCAN_INTERVAL
 from .const import DOMAIN
+from .const import PLATFORMS_BY_PRODUCT_TYPE
+from .const import SIGNAL_DEVICES_ADDED
+from .const import SIGNAL_DEVICES_REMOVED
+from .api import MarsHydroCircuitOpenError
+from .command_queue import CommandQueue
+from .rate_limit import PRIORITY_POLL, PRIORITY_VERIFY
+from .scheduler import AdaptivePollScheduler
 
-SCAN_INTERVAL = timedelta(seconds=60)
+# Consecutive failed fetches after which a device is shown unavailable
+STALE_AFTER_FAILURES = 3
+# How often the device list is fetched again to find added or removed devices
+REDISCOVERY_INTERVAL = timedelta(minutes=30)
+# Rediscoveries in a row a device must be missing from before it is removed
+REMOVE_AFTER_MISSED_DISCOVERIES = 2
+# Snapshot writes within this many seconds are batched into one
+SNAPSHOT_SAVE_DELAY = 10
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
+
+def group_context_for(group_id) -> str:
+    """Return the listener context group entities register with."""
+    return f"group_{group_id}"
+
 class MarsHydroDataUpdateCoordinator(DataUpdateCoordinator):
     """My custom coordinator."""
 
-    def __init__(self, hass, config_entry, my_api):
+    def __init__(self, hass, config_entry, my_api, snapshot_store=None):
         """Initialize my coordinator."""
+        min_interval = timedelta(
+            seconds=config_entry.options.get(
+                CONF_MIN_SCAN_INTERVAL, DEFAULT_MIN_SCAN_INTERVAL
+            )
+        )
+        max_interval = timedelta(
+            seconds=config_entry.options.get(
+                CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL
+            )
+        )
+        # Climate readings of fans change faster than the state of lights
+        tiers = {
+            "WIND": timedelta(
+                seconds=config_entry.options.get(
+                    CONF_WIND_SCAN_INTERVAL, DEFAULT_WIND_SCAN_INTERVAL
+                )
+            ),
+            "LIGHT": timedelta(
+                seconds=config_entry.options.get(
+                    CONF_LIGHT_SCAN_INTERVAL, DEFAULT_LIGHT_SCAN_INTERVAL
+                )
+            ),
+        }
+        scheduler = AdaptivePollScheduler(min_interval, max_interval, tiers=tiers)
         super().__init__(
             hass,
             _LOGGER,
@@ -31,19 +94,40 @@ class MarsHydroDataUpdateCoordinator(DataUpdateCoordinator):
             name = DOMAIN,
             config_entry = config_entry,
             # Polling interval. Will only be polled if there are subscribers.
-            update_interval = SCAN_INTERVAL,
+            # Each tick only fetches the devices the scheduler reports as due.
+            update_interval = scheduler.tick,
             # Set always_update to `False` if the data returned from the
             # api can be compared via `__eq__` to avoid duplicate updates
             # being dispatched to listeners
             always_update = False
         )
         _LOGGER.info("Initializing Cordinator")
+        # Platforms forwarded for this entry, in the order they were loaded
         self._platforms = []
         self._my_api = my_api
-        self._devices: MarsHydroDevices | list = list
-        self._prev_temp = '21'
-        self._prev_humi = '50'
-        self._invalid_values = ['-', '100', '0']
+        # Device registry indexes, kept in sync by _add_device/_remove_device
+        self._devices_by_id: dict[int, MarsHydroDevice] = {}
+        self._devices_by_type: dict[str, dict[int, MarsHydroDevice]] = {}
+        self._devices_by_group: dict[int, dict[int, MarsHydroDevice]] = {}
+        self._max_concurrent_requests = config_entry.options.get(
+            CONF_MAX_CONCURRENT_REQUESTS, DEFAULT_MAX_CONCURRENT_REQUESTS
+        )
+        self._request_semaphore = asyncio.Semaphore(self._max_concurrent_requests)
+        self._prefetched: dict[int, asyncio.Future] = {}
+        self._refresh_changes: dict[int, frozenset[str]] | None = None
+        self._notified_success = True
+        # device id -> consecutive failed detail fetches
+        self._stale: dict[int, int] = {}
+        # device id -> rediscoveries in a row the device was missing from
+        self._missed_discoveries: dict[int, int] = {}
+        # Fields of the device being dispatched, None while all are notified
+        self.updated_fields: frozenset[str] | None = None
+        self.last_update_duration: float | None = None
+        self._scheduler = scheduler
+        # device id -> (command completed at, intended state, replaced values)
+        self._pending_state: dict[int, tuple[float, dict, dict]] = {}
+        self._command_queue = CommandQueue()
+        self._snapshot_store = snapshot_store
         
         
 
@@ -57,10 +141,155 @@ class MarsHydroDataUpdateCoordinator(DataUpdateCoordinator):
         coordinator.async_config_entry_first_refresh.
         """
         _LOGGER.info("Cordinator _async_setup")
-        self._devices = await self._my_api.async_get_devices()
+        self._set_devices([])
+        # Start detail fetches while later device list pages are still loading
+        try:
+            async for device in self._my_api.async_iter_devices():
+                self._add_device(device)
+                self._prefetched[device["id"]] = asyncio.ensure_future(
+                    self._async_fetch_device_data(device["id"])
+                )
+        except BaseException:
+            for prefetched in self._prefetched.values():
+                prefetched.cancel()
+            self._prefetched.clear()
+            raise
         
 
 
+    async def async_restore_snapshot(self) -> bool:
+        """Load the device list and payloads saved by the last run.
+
+        Returns False when there is no usable snapshot, then the first
+        refresh has to build the device list from the cloud.
+        """
+        if self._snapshot_store is None:
+            return False
+        snapshot = await self._snapshot_store.async_load()
+        if not snapshot:
+            return False
+        try:
+            devices = snapshot["devices"]
+            device_data = {
+                int(dev_id): MarsHydroDeviceState(**record)
+                for dev_id, record in snapshot["data"].items()
+            }
+            # The indexes rely on these keys, check them before touching state
+            for device in devices:
+                if not isinstance(device["id"], int) or not isinstance(
+                    device["productType"], str
+                ):
+                    raise ValueError(f"invalid device record {device!r}")
+                device_data.setdefault(
+                    device["id"], self._parse_device_data(device["id"], device)
+                )
+        except (KeyError, TypeError, ValueError) as err:
+            _LOGGER.warning("Discarding unreadable device snapshot: %s", err)
+            return False
+        self._set_devices(devices)
+        self.data = device_data
+        _LOGGER.info(
+            "Restored %d devices saved %.0fs ago",
+            len(devices),
+            time.time() - snapshot.get("saved_at", time.time()),
+        )
+        return True
+
+    async def async_reconcile_snapshot(self) -> None:
+        """Bring restored devices and payloads up to date with the cloud."""
+        await self.async_rediscover_devices()
+        await self.async_refresh()
+
+    @callback
+    def _async_save_snapshot(self) -> None:
+        if self._snapshot_store is not None and self.data is not None:
+            self._snapshot_store.async_delay_save(
+                self._snapshot_data, SNAPSHOT_SAVE_DELAY
+            )
+
+    def _snapshot_data(self) -> dict:
+        return {
+            "saved_at": time.time(),
+            "devices": list(self._devices),
+            "data": {
+                str(dev_id): asdict(record) for dev_id, record in self.data.items()
+            },
+        }
+
+    async def async_rediscover_devices(self, _now=None) -> None:
+        """Fetch the device list again and apply the difference in place."""
+        try:
+            devices = await self._my_api.async_get_devices()
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.warning("Error rediscovering devices: %s", err)
+            return
+
+        if not devices:
+            # More likely a cloud hiccup than every device being deleted
+            _LOGGER.warning("Rediscovery returned no devices, keeping the known ones")
+            return
+
+        current_ids = {device["id"] for device in devices}
+        removed = []
+        for dev_id in self._devices_by_id:
+            if dev_id in current_ids:
+                self._missed_discoveries.pop(dev_id, None)
+                continue
+            missed = self._missed_discoveries.get(dev_id, 0) + 1
+            self._missed_discoveries[dev_id] = missed
+            if missed >= REMOVE_AFTER_MISSED_DISCOVERIES:
+                removed.append(dev_id)
+            else:
+                _LOGGER.info("Device %s missing from the device list", dev_id)
+        added = [device for device in devices if device["id"] not in self._devices_by_id]
+        for device in devices:
+            self._add_device(device)
+
+        if removed:
+            _LOGGER.info("Devices removed from the account: %s", removed)
+            for dev_id in removed:
+                self._remove_device(dev_id)
+                self._scheduler.forget(dev_id)
+                self._pending_state.pop(dev_id, None)
+                self._stale.pop(dev_id, None)
+                self._missed_discoveries.pop(dev_id, None)
+            self.data = {
+                dev_id: payload
+                for dev_id, payload in self.data.items()
+                if dev_id not in removed
+            }
+            async_dispatcher_send(
+                self.hass,
+                SIGNAL_DEVICES_REMOVED.format(self.config_entry.entry_id),
+                set(removed),
+            )
+
+        if added:
+            _LOGGER.info(
+                "Devices added to the account: %s", [device["id"] for device in added]
+            )
+            # Entities read their initial state from the data on creation
+            results = await asyncio.gather(
+                *[self._async_fetch_device_data(device["id"]) for device in added],
+                return_exceptions=True,
+            )
+            device_data = dict(self.data)
+            for device, result in zip(added, results):
+                if isinstance(result, BaseException):
+                    _LOGGER.warning(
+                        "Error fetching added device %s: %s", device["id"], result
+                    )
+                    result = self._parse_device_data(device["id"], device)
+                device_data[device["id"]] = result
+            self.data = device_data
+            async_dispatcher_send(
+                self.hass,
+                SIGNAL_DEVICES_ADDED.format(self.config_entry.entry_id),
+                added,
+            )
+        if removed or added:
+            self._async_save_snapshot()
+
     async def _async_update_data(self) -> ...:
         """Fetch data from API endpoint.
 
@@ -68,56 +297,346 @@ class MarsHydroDataUpdateCoordinator(DataUpdateCoordinator):
         so entities can quickly look up their data.
         """
         """Update data via library."""
-        _LOGGER.info("Cordinator _async_update_data")
+        _LOGGER.debug("Cordinator _async_update_data")
         try:
             
-            listening_idx = set(self.async_contexts())
-            device_data = dict()
-            for device in self._devices:
-                dev_id = device["id"]
-                device_data[dev_id] = await self._my_api.async_get_device_data(dev_id)
-            _LOGGER.info("Device data: %s", str(device_data))
+            start = time.monotonic()
+
+            async def fetch(dev_id):
+                prefetched = self._prefetched.pop(dev_id, None)
+                if prefetched is not None:
+                    return dev_id, await prefetched
+                # Reads of devices with an unconfirmed command verify it
+                priority = (
+                    PRIORITY_VERIFY if dev_id in self._pending_state else PRIORITY_POLL
+                )
+                return dev_id, await self._async_fetch_device_data(dev_id, priority)
+
+            if self.data is None:
+                # Entities are created from the first refresh, fetch everything
+                polled = [device["id"] for device in self._devices]
+            else:
+                polled = self._listening_device_ids()
+            due = self._scheduler.due(polled)
+            results = await asyncio.gather(
+                *[fetch(dev_id) for dev_id in due], return_exceptions=True
+            )
+            # Commands may have changed the data while the fetches ran
+            previous = self.data or {}
+            device_data = dict(previous)
+            now = time.monotonic()
+            self.last_update_duration = now - start
+            changes = {}
+            failed = 0
+            for dev_id, result in zip(due, results):
+                if isinstance(result, BaseException):
+                    failed += 1
+                    if dev_id not in device_data:
+                        # Keep entities buildable from the device list record
+                        device_data[dev_id] = self._parse_device_data(
+                            dev_id, self._devices_by_id[dev_id]
+                        )
+                    if isinstance(result, MarsHydroCircuitOpenError):
+                        # Rejected for the whole account, not a device fault
+                        continue
+                    failures = self._record_device_failure(dev_id, result, now)
+                    if (
+                        failures >= STALE_AFTER_FAILURES
+                        and not device_data[dev_id].stale
+                    ):
+                        # Part of the data so the refresh notifies listeners
+                        device_data[dev_id] = replace(device_data[dev_id], stale=True)
+                        changes[dev_id] = STATE_FIELDS
+                    continue
+                payload = self._reconcile_pending_state(dev_id, result[1], start)
+                changed = payload.changed_fields(previous.get(dev_id))
+                self._stale.pop(dev_id, None)
+                if "stale" in changed:
+                    # Availability depends on every field, not just the diff
+                    changed = STATE_FIELDS
+                self._scheduler.record_result(
+                    dev_id, bool(changed), now, offline=not payload.connect_status
+                )
+                device_data[dev_id] = payload
+                if changed:
+                    changes[dev_id] = changed
+            # Single failing devices only go stale, the account fails when
+            # the cloud is unreachable or no polled device answers any more
+            if due and failed == len(due) and (
+                self.data is None
+                or any(isinstance(r, MarsHydroCircuitOpenError) for r in results)
+                or all(
+                    self._stale.get(dev_id, 0) >= STALE_AFTER_FAILURES
+                    for dev_id in polled
+                )
+            ):
+                raise UpdateFailed(f"All {failed} device detail requests failed")
+            # Picked up by async_update_listeners once the data is stored
+            self._refresh_changes = changes if self.data is not None else None
+            if due:
+                _LOGGER.info(
+                    "Fetched %d of %d devices (%d listened to) in %.3fs "
+                    "(max %d concurrent requests)",
+                    len(results),
+                    len(self._devices),
+                    len(polled),
+                    self.last_update_duration,
+                    self._max_concurrent_requests,
+                )
+            _LOGGER.debug("Device data: %s", str(device_data))
             #return await self._my_api.async_get_device_data(self._device_id)
             return device_data
         except Exception as exception:
             _LOGGER.error("Error _async_update_data: %s", str(exception))
+            self._refresh_changes = None
             raise UpdateFailed() from exception
 
-    async def async_update_device_data(self, device_id):
-        """Fetch only fan data separately."""
-        _LOGGER.info("Cordinator async_update_device_data")
+    def _record_device_failure(self, device_id, err, now=None) -> int:
+        """Back a failing device off, return its consecutive failures."""
+        failures = self._scheduler.record_failure(device_id, now)
+        self._stale[device_id] = failures
+        _LOGGER.warning(
+            "Error fetching device %s (%d in a row): %s", device_id, failures, err
+        )
+        return failures
+
+    def is_device_stale(self, device_id) -> bool:
+        """Return True when the last good payload of a device is outdated."""
+        record = (self.data or {}).get(device_id)
+        return record is not None and record.stale
+
+    async def _async_fetch_device_data(
+        self, device_id, priority=PRIORITY_POLL
+    ) -> MarsHydroDeviceState:
+        """Fetch and parse one device, a malformed payload fails like the fetch."""
+        async with self._request_semaphore:
+            payload = await self._my_api.async_get_device_data(device_id, priority)
+        return self._parse_device_data(device_id, payload)
+
+    async def async_send_command(
+        self, device_id, state: dict, command, *args, coalesce: bool = False
+    ):
+        """Send a command and show its intended state right away.
+
+        ``state`` is applied to the cached device record before ``command``
+        is awaited and stays pending until a detail read confirms it. If the
+        command fails the record is rolled back. With ``coalesce`` set, rapid
+        commands for the same device collapse into the last one.
+        """
+        await self._async_send([device_id], device_id, state, command, args, coalesce)
+
+    async def async_send_group_command(
+        self, group_id, state: dict, command, *args, coalesce: bool = False
+    ):
+        """Send one group-addressed command, updating every member."""
+        members = [device["id"] for device in self.get_group_devices(group_id)]
+        await self._async_send(
+            members, f"group_{group_id}", state, command, args, coalesce
+        )
+
+    async def _async_send(self, device_ids, queue_key, state, command, args, coalesce):
+        for device_id in device_ids:
+            self.async_apply_pending_state(device_id, state)
         try:
-            clima_data = await self._my_api.async_get_device_data(device_id)
-            if 'productType' in clima_data and clima_data["productType"] == "WIND":
-                clima_data = self.normalize_temp_humi_abnormal_values(clima_data)
-            self.data[device_id] = clima_data
-            self.async_set_updated_data(self.data)
-        except Exception as err:
-            raise UpdateFailed(f"Error fetching fan data: {err}")
+            if coalesce:
+                await self._command_queue.async_submit(queue_key, command, *args)
+            else:
+                await command(*args)
+        except Exception:
+            for device_id in device_ids:
+                self.async_rollback_pending_state(device_id)
+            raise
+        # Only reads issued after the command completed may confirm it
+        now = time.monotonic()
+        for device_id in device_ids:
+            pending = self._pending_state.get(device_id)
+            if pending is not None:
+                self._pending_state[device_id] = (now, *pending[1:])
+            self._scheduler.boost(device_id)
+
+    async def async_shutdown(self) -> None:
+        """Cancel queued commands when the entry unloads."""
+        self._command_queue.close()
+        await super().async_shutdown()
 
+    @callback
+    def async_apply_pending_state(self, device_id, state: dict) -> None:
+        """Apply the intended state of a command to the cached record."""
+        record = self.data.get(device_id)
+        if record is None:
+            return
+        previous = {key: getattr(record, key) for key in state}
+        if device_id in self._pending_state:
+            _, pending_intended, pending_previous = self._pending_state[device_id]
+            state = {**pending_intended, **state}
+            previous = {**previous, **pending_previous}
+        self._pending_state[device_id] = (float("inf"), state, previous)
+        self.data = {**self.data, device_id: replace(record, **state)}
+        self.async_update_device_listeners(device_id, frozenset(state))
 
-    def normalize_temp_humi_abnormal_values(self, clima_data):
+    @callback
+    def async_rollback_pending_state(self, device_id) -> None:
+        """Restore the values a pending command replaced."""
+        pending = self._pending_state.pop(device_id, None)
+        if pending is None:
+            return
+        record = self.data.get(device_id)
+        if record is None:
+            return
+        self.data = {**self.data, device_id: replace(record, **pending[2])}
+        self.async_update_device_listeners(device_id, frozenset(pending[2]))
 
-        if clima_data["temperature"] in self._invalid_values:
-            clima_data["temperature"] = self._prev_temp
-        elif clima_data["temperature"] != self._prev_temp:
-            self._prev_temp = clima_data["temperature"]
+    def _reconcile_pending_state(self, device_id, device_data, requested_at):
+        """Confirm or roll back a pending command with a fresh read."""
+        pending = self._pending_state.get(device_id)
+        if pending is None:
+            return device_data
+        sent_at, intended, _ = pending
+        if requested_at < sent_at:
+            # The read was issued before the command completed
+            return replace(device_data, **intended)
+        del self._pending_state[device_id]
+        if any(getattr(device_data, key) != value for key, value in intended.items()):
+            _LOGGER.warning(
+                "Device %s did not apply %s, rolling back", device_id, intended
+            )
+        return device_data
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Notify only the entities of devices whose fields changed.
+
+        Falls back to notifying everyone when no per-device diff is known,
+        e.g. on the first refresh or when the update success state flipped.
+        """
+        changes, self._refresh_changes = self._refresh_changes, None
+        if self.last_update_success and changes != {}:
+            self._async_save_snapshot()
+        if changes is None or self.last_update_success != self._notified_success:
+            self._notified_success = self.last_update_success
+            self.updated_fields = None
+            super().async_update_listeners()
+            return
+        self._notify_changes(self._listeners_by_context(), changes)
 
-        if clima_data["humidity"] in self._invalid_values:
-            clima_data["humidity"] = self._prev_humi
-        else:
-            self._prev_humi = clima_data["humidity"]
+    @callback
+    def async_update_device_listeners(self, device_id, changed=None) -> None:
+        """Notify only the entities registered with the device as context."""
+        self._notify_changes(self._listeners_by_context(), {device_id: changed})
 
-        return clima_data
+    def _listeners_by_context(self) -> dict:
+        listeners: dict = {}
+        for update_callback, context in list(self._listeners.values()):
+            listeners.setdefault(context, []).append(update_callback)
+        return listeners
+
+    def _notify_changes(self, listeners, changes: dict) -> None:
+        """Notify each changed device, then each group it belongs to once.
+
+        A group is notified with the union of its members' changed fields,
+        None (every field) if any member changed without a known diff.
+        """
+        groups: dict = {}
+        for device_id, changed in changes.items():
+            self._notify_context(listeners, device_id, changed)
+            device = self._devices_by_id.get(device_id)
+            if device is None or not device.get("groupId"):
+                continue
+            context = group_context_for(device["groupId"])
+            if changed is None or (context in groups and groups[context] is None):
+                groups[context] = None
+            else:
+                groups[context] = groups.get(context, frozenset()) | changed
+        for context, changed in groups.items():
+            self._notify_context(listeners, context, changed)
+
+    def _notify_context(self, listeners, context, changed) -> None:
+        # Entities read updated_fields to skip writes for fields they ignore
+        self.updated_fields = changed
+        try:
+            for update_callback in listeners.get(context, ()):
+                update_callback()
+        finally:
+            self.updated_fields = None
+
+    def _listening_device_ids(self) -> list[int]:
+        """Return the devices at least one enabled entity listens to."""
+        groups = {
+            group_context_for(group_id): members
+            for group_id, members in self._devices_by_group.items()
+        }
+        device_ids = set()
+        for context in self.async_contexts():
+            if context in self._devices_by_id:
+                device_ids.add(context)
+            elif context in groups:
+                device_ids.update(groups[context])
+        return list(device_ids)
+
+    def _parse_device_data(self, device_id, payload) -> MarsHydroDeviceState:
+        """Parse a raw payload once, falling back to the last climate values."""
+        previous = (self.data or {}).get(device_id)
+        return MarsHydroDeviceState.from_payload(payload, previous)
+
+    @property
+    def _devices(self):
+        return self._devices_by_id.values()
+
+    def _set_devices(self, devices: list[MarsHydroDevice]) -> None:
+        """Rebuild the indexes from a full device list."""
+        self._devices_by_id = {}
+        self._devices_by_type = {}
+        self._devices_by_group = {}
+        for device in devices:
+            self._add_device(device)
+
+    def _add_device(self, device: MarsHydroDevice) -> None:
+        if device["id"] in self._devices_by_id:
+            self._remove_device(device["id"])
+        self._devices_by_id[device["id"]] = device
+        self._scheduler.assign(device["id"], device["productType"])
+        self._devices_by_type.setdefault(device["productType"], {})[device["id"]] = device
+        if device.get("groupId"):
+            self._devices_by_group.setdefault(device["groupId"], {})[device["id"]] = device
+
+    def _remove_device(self, device_id: int) -> MarsHydroDevice | None:
+        device = self._devices_by_id.pop(device_id, None)
+        if device is None:
+            return None
+        by_type = self._devices_by_type.get(device["productType"], {})
+        by_type.pop(device_id, None)
+        if not by_type:
+            self._devices_by_type.pop(device["productType"], None)
+        if device.get("groupId"):
+            group = self._devices_by_group.get(device["groupId"], {})
+            group.pop(device_id, None)
+            if not group:
+                self._devices_by_group.pop(device["groupId"], None)
+        return device
+
+    def required_platforms(self) -> set[str]:
+        """Return the platforms the product types on the account need."""
+        platforms = set()
+        for prod_type in self._devices_by_type:
+            platforms.update(PLATFORMS_BY_PRODUCT_TYPE.get(prod_type, ()))
+        return platforms
+
+    def get_devices_by_type(self, prod_type) -> list[MarsHydroDevice]:
+        return list(self._devices_by_type.get(prod_type, {}).values())
 
     def get_device_by_type(self, prod_type) -> MarsHydroDevice | None:
-        for device in self._devices:
-            if device["productType"] == prod_type:
-                return device
-        return None
-    
+        return next(iter(self._devices_by_type.get(prod_type, {}).values()), None)
+
+    def get_groups(self, prod_type) -> dict[int, list[MarsHydroDevice]]:
+        """Return the groups whose members are all of ``prod_type``."""
+        return {
+            group_id: list(members.values())
+            for group_id, members in self._devices_by_group.items()
+            if all(device["productType"] == prod_type for device in members.values())
+        }
+
+    def get_group_devices(self, group_id) -> list[MarsHydroDevice]:
+        return list(self._devices_by_group.get(group_id, {}).values())
+
     def get_device_by_id(self, device_id: int) -> MarsHydroDevice | None:
-        for device in self._devices:
-            if device["id"] == device_id:
-                return device
-        return None
\ No newline at end of file
+        return self._devices_by_id.get(device_id)
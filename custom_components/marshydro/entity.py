@@ -1,14 +1,37 @@
 """ClevastEntity class"""
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers import entity_registry as er
 from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.core import callback
 import logging
 
 from .const import DOMAIN
 from .const import NAME
+from .const import SIGNAL_DEVICES_REMOVED
+from .coordinator import group_context_for
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
+
+async def async_retire_entity(entity) -> None:
+    """Remove an entity whose device left the account, with its device entry."""
+    entity_registry = er.async_get(entity.hass)
+    registry_entry = entity_registry.async_get(entity.entity_id)
+    if registry_entry is None:
+        await entity.async_remove(force_remove=True)
+        return
+    device_registry = dr.async_get(entity.hass)
+    if registry_entry.device_id and device_registry.async_get(registry_entry.device_id):
+        # Also removes every entity of this entry attached to the device
+        device_registry.async_update_device(
+            registry_entry.device_id,
+            remove_config_entry_id=registry_entry.config_entry_id,
+        )
+    else:
+        entity_registry.async_remove(entity.entity_id)
+
 class MarsHydroEntity(CoordinatorEntity):
     """An entity using CoordinatorEntity.
 
@@ -19,6 +42,9 @@ class MarsHydroEntity(CoordinatorEntity):
       available
 
     """
+    # Device state fields this entity renders; other changes skip the write
+    _state_fields = frozenset({"connect_status", "is_close", "light_rate"})
+
     def __init__(self, coordinator, idx):
         super().__init__(coordinator, context=idx)
         device = coordinator.get_device_by_id(int(idx))
@@ -30,7 +56,20 @@ class MarsHydroEntity(CoordinatorEntity):
         self._speed = device["speed"]
         self._speed_percentage = self._brightness
         self._coordinator._device_id = idx
-        
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                SIGNAL_DEVICES_REMOVED.format(self._coordinator.config_entry.entry_id),
+                self._async_devices_removed,
+            )
+        )
+
+    async def _async_devices_removed(self, device_ids) -> None:
+        if self.idx in device_ids:
+            await async_retire_entity(self)
 
     @property
     def unique_id(self):
@@ -45,7 +84,10 @@ class MarsHydroEntity(CoordinatorEntity):
     @property
     def available(self) -> bool:
         """Return True if roller and hub is available."""
-        return self._coordinator.data[self.idx]["connectStatus"]
+        return (
+            self._coordinator.data[self.idx].connect_status
+            and not self._coordinator.is_device_stale(self.idx)
+        )
 
     @property
     def device_info(self) -> DeviceInfo:
@@ -57,9 +99,9 @@ class MarsHydroEntity(CoordinatorEntity):
             },
             name = self._device_name,
             manufacturer = NAME,
-            model = self._coordinator.data[self.idx]["deviceSerialnum"],
-            model_id = self._coordinator.data[self.idx]["productId"],
-            sw_version = str(self._coordinator.data[self.idx]["deviceVersion"]),
+            model = self._coordinator.data[self.idx].serial_number,
+            model_id = self._coordinator.data[self.idx].product_id,
+            sw_version = self._coordinator.data[self.idx].device_version,
         )
 
     @property
@@ -73,11 +115,109 @@ class MarsHydroEntity(CoordinatorEntity):
 
     async def modify_device_state(self, new_state: bool = False):
         self._state = new_state
-        await self._coordinator._my_api.toggle_switch(new_state, self.unique_id)
-        await self._coordinator.async_request_refresh()
+        await self._coordinator.async_send_command(
+            self.idx,
+            {"is_close": new_state},
+            self._coordinator._my_api.toggle_switch,
+            new_state,
+            self.unique_id,
+        )
     
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
-        self._attr_is_on = not self._coordinator.data[self.idx]["isClose"]
+        updated_fields = self._coordinator.updated_fields
+        if updated_fields is not None and not updated_fields & self._state_fields:
+            return
+        self._attr_is_on = not self._coordinator.data[self.idx].is_close
+        self.async_write_ha_state()
+
+
+class MarsHydroGroupEntity(CoordinatorEntity):
+    """An entity controlling every device of a cloud group with one request."""
+
+    _state_fields = frozenset({"connect_status", "is_close", "light_rate"})
+
+    def __init__(self, coordinator, group_id):
+        super().__init__(coordinator, context=group_context_for(group_id))
+        self._coordinator = coordinator
+        self.group_id = group_id
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                SIGNAL_DEVICES_REMOVED.format(self._coordinator.config_entry.entry_id),
+                self._async_devices_removed,
+            )
+        )
+
+    async def _async_devices_removed(self, device_ids) -> None:
+        if not self._member_ids:
+            await async_retire_entity(self)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        updated_fields = self._coordinator.updated_fields
+        if updated_fields is not None and not updated_fields & self._state_fields:
+            return
         self.async_write_ha_state()
+
+    @property
+    def _member_ids(self):
+        return [
+            device["id"] for device in self._coordinator.get_group_devices(self.group_id)
+        ]
+
+    @property
+    def unique_id(self):
+        return f"group_{self.group_id}"
+
+    @property
+    def available(self) -> bool:
+        return any(
+            self._coordinator.data[idx].connect_status
+            and not self._coordinator.is_device_stale(idx)
+            for idx in self._member_ids
+        )
+
+    @property
+    def is_on(self):
+        """Return True if any member is on."""
+        return any(
+            not self._coordinator.data[idx].is_close for idx in self._member_ids
+        )
+
+    @property
+    def _light_rate(self):
+        """Return the average deviceLightRate of the members that are on."""
+        rates = [
+            self._coordinator.data[idx].light_rate
+            for idx in self._member_ids
+            if not self._coordinator.data[idx].is_close
+        ]
+        if not rates:
+            return 0
+        return round(sum(rates) / len(rates))
+
+    async def modify_group_state(self, new_state: bool = False):
+        await self._coordinator.async_send_group_command(
+            self.group_id,
+            {"is_close": new_state},
+            self._coordinator._my_api.toggle_switch,
+            new_state,
+            None,
+            self.group_id,
+        )
+
+    async def set_group_light_rate(self, light_rate: int):
+        await self._coordinator.async_send_group_command(
+            self.group_id,
+            {"light_rate": light_rate},
+            self._coordinator._my_api.async_set_device_p,
+            light_rate,
+            None,
+            self.group_id,
+            coalesce=True,
+        )
@@ -1,8 +1,11 @@
 from typing import Any, cast, Optional
 from homeassistant.components.fan import FanEntity, FanEntityFeature
 from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.core import callback
 from homeassistant.helpers.device_registry import DeviceInfo
-from .entity import MarsHydroEntity
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from .const import SIGNAL_DEVICES_ADDED
+from .entity import MarsHydroEntity, MarsHydroGroupEntity
 from . import _LOGGER, DOMAIN
 from datetime import timedelta
 
@@ -11,10 +14,31 @@ async def async_setup_entry(hass, entry, async_add_entities):
     """Set up the Mars Hydro fan entity."""
     _LOGGER.debug("Mars Hydro fan async_setup_entry called")
     coordinator = hass.data[DOMAIN][entry.entry_id]
+    known_groups = set()
 
-    device = coordinator.get_device_by_type("WIND")
-    fan = MarsHydroFanEntity(coordinator, device["id"])
-    async_add_entities([fan], update_before_add=True)
+    @callback
+    def async_add_devices(devices):
+        fans = [
+            MarsHydroFanEntity(coordinator, device["id"])
+            for device in devices
+            if device["productType"] == "WIND"
+        ]
+        groups = []
+        for group_id in coordinator.get_groups("WIND"):
+            if group_id not in known_groups:
+                known_groups.add(group_id)
+                groups.append(MarsHydroGroupFan(coordinator, group_id))
+        if fans or groups:
+            async_add_entities([*fans, *groups])
+
+    # The coordinator already holds data for every device, entities
+    # are built from it without fetching again before they are added
+    async_add_devices(coordinator.get_devices_by_type("WIND"))
+    entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, SIGNAL_DEVICES_ADDED.format(entry.entry_id), async_add_devices
+        )
+    )
 
 SCAN_INTERVAL = timedelta(seconds=60)
 
@@ -34,20 +58,20 @@ class MarsHydroFanEntity(MarsHydroEntity, FanEntity):
         dev_info = super().device_info
         dev_info["model"] = "DF100-M"
         dev_info["name"] = f"iFresh Fan - ({self.name})"
-        dev_info["sw_version"] = str(self._coordinator.data[self.idx]["deviceVersion"])
+        dev_info["sw_version"] = self._coordinator.data[self.idx].device_version
         return dev_info
 
     @property
     def is_on(self):
         """Return True if the light is on."""
-        return not self._coordinator.data[self.idx]["isClose"]
+        return not self._coordinator.data[self.idx].is_close
         #return self._state
 
     @property
     def percentage(self):
         """Return the current speed percentage of the fan."""
         #return self._speed_percentage
-        return self._coordinator.data[self.idx]["deviceLightRate"]
+        return self._coordinator.data[self.idx].light_rate
 
     @property
     def supported_features(self):
@@ -72,8 +96,47 @@ class MarsHydroFanEntity(MarsHydroEntity, FanEntity):
             _LOGGER.error(f"Fan speed percentage {percentage} not in range, aborting.")
             return
         
-        await self._coordinator._my_api.async_set_device_p(round(percentage), self.unique_id)
-        await self._coordinator.async_request_refresh()
+        await self._coordinator.async_send_command(
+            self.idx,
+            {"light_rate": round(percentage)},
+            self._coordinator._my_api.async_set_device_p,
+            round(percentage),
+            self.unique_id,
+            coalesce=True,
+        )
         
 
     
+
+
+class MarsHydroGroupFan(MarsHydroGroupEntity, FanEntity):
+    """All fans of a cloud group, switched and throttled with one request."""
+
+    _attr_supported_features = (
+        FanEntityFeature.SET_SPEED | FanEntityFeature.TURN_ON | FanEntityFeature.TURN_OFF
+    )
+
+    @property
+    def name(self):
+        return f"Fan group {self.group_id}"
+
+    @property
+    def percentage(self):
+        """Return the average speed percentage of the fans that are on."""
+        return self._light_rate
+
+    async def async_turn_on(self, percentage: Optional[int] = None, preset_mode: Optional[str] = None, **kwargs: Any) -> None:
+        """Turn on every fan of the group."""
+        await self.modify_group_state(False)
+
+    async def async_turn_off(self, **kwargs: Any) -> None:
+        """Turn off every fan of the group."""
+        await self.modify_group_state(True)
+
+    async def async_set_percentage(self, percentage: int) -> None:
+        """Set the speed percentage of every fan in the group."""
+        if percentage < 25 or percentage > 100:
+            _LOGGER.error(f"Fan speed percentage {percentage} not in range, aborting.")
+            return
+
+        await self.set_group_light_rate(round(percentage))
@@ -1,13 +1,16 @@
 from typing import Any, cast
 from homeassistant.exceptions import ConfigEntryNotReady
-from .entity import MarsHydroEntity
+from .entity import MarsHydroEntity, MarsHydroGroupEntity
 from homeassistant.components.light import (
     ATTR_BRIGHTNESS,
     ColorMode,
     LightEntity,
 )
+from homeassistant.core import callback
 from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from . import _LOGGER, DOMAIN
+from .const import SIGNAL_DEVICES_ADDED
 from datetime import timedelta
 
 async def async_setup_entry(hass, entry, async_add_entities):
@@ -16,10 +19,31 @@ async def async_setup_entry(hass, entry, async_add_entities):
     _LOGGER.debug("Mars Hydro Light async_setup_entry called")
 
     coordinator = hass.data[DOMAIN][entry.entry_id]
-    
-    device = coordinator.get_device_by_type("LIGHT")
-    light = MarsHydroBrightnessLight(coordinator, device["id"])
-    async_add_entities([light], update_before_add=True)
+    known_groups = set()
+
+    @callback
+    def async_add_devices(devices):
+        lights = [
+            MarsHydroBrightnessLight(coordinator, device["id"])
+            for device in devices
+            if device["productType"] == "LIGHT"
+        ]
+        groups = []
+        for group_id in coordinator.get_groups("LIGHT"):
+            if group_id not in known_groups:
+                known_groups.add(group_id)
+                groups.append(MarsHydroGroupLight(coordinator, group_id))
+        if lights or groups:
+            async_add_entities([*lights, *groups])
+
+    # The coordinator already holds data for every device, entities
+    # are built from it without fetching again before they are added
+    async_add_devices(coordinator.get_devices_by_type("LIGHT"))
+    entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, SIGNAL_DEVICES_ADDED.format(entry.entry_id), async_add_devices
+        )
+    )
 
 SCAN_INTERVAL = timedelta(seconds=60)
 
@@ -38,7 +62,7 @@ class MarsHydroBrightnessLight(MarsHydroEntity, LightEntity):
         dev_info = super().device_info
         dev_info["model"] = "FC 1500-EVO"
         dev_info["name"] = f"EVO light - ({self.name})"
-        dev_info["sw_version"] = str(self._coordinator.data[self.idx]["deviceVersion"])
+        dev_info["sw_version"] = self._coordinator.data[self.idx].device_version
         return dev_info
     
     @property
@@ -49,7 +73,7 @@ class MarsHydroBrightnessLight(MarsHydroEntity, LightEntity):
     def brightness(self):
         """Return the brightness of the light (0-255)."""
         #return self._coordinator.data[self.idx]["deviceLightRate"]
-        brigtness_p = self._coordinator.data[self.idx]["deviceLightRate"]
+        brigtness_p = self._coordinator.data[self.idx].light_rate
         #return int((brigtness_p * 255) / 100)
         return self.to_byte(brigtness_p)
 
@@ -57,7 +81,7 @@ class MarsHydroBrightnessLight(MarsHydroEntity, LightEntity):
     def is_on(self):
         """Return True if the light is on."""
         #return self._state
-        return not self._coordinator.data[self.idx]["isClose"]
+        return not self._coordinator.data[self.idx].is_close
 
     @property
     def supported_color_modes(self):
@@ -95,13 +119,47 @@ class MarsHydroBrightnessLight(MarsHydroEntity, LightEntity):
         _LOGGER.info(f"Brightness to be set to {brightness}")
         brightness_percentage = self.to_percentage(brightness)
         
-        await self._coordinator._my_api.async_set_device_p(brightness_percentage, self.unique_id)
+        await self._coordinator.async_send_command(
+            self.idx,
+            {"light_rate": brightness_percentage},
+            self._coordinator._my_api.async_set_device_p,
+            brightness_percentage,
+            self.unique_id,
+            coalesce=True,
+        )
 
         _LOGGER.info(f"Brightness set to {brightness_percentage}%")
-        await self._coordinator.async_request_refresh()
 
     def to_percentage(self, val):
         return round( (val * 100) / 255)
     
     def to_byte(self, val):
-        return int( (val * 255) / 100)
\ No newline at end of file
+        return int( (val * 255) / 100)
+
+
+class MarsHydroGroupLight(MarsHydroGroupEntity, LightEntity):
+    """All lights of a cloud group, switched and dimmed with one request."""
+
+    _attr_color_mode = ColorMode.BRIGHTNESS
+    _attr_supported_color_modes = {ColorMode.BRIGHTNESS}
+
+    @property
+    def name(self):
+        return f"Light group {self.group_id}"
+
+    @property
+    def brightness(self):
+        """Return the average brightness of the lights that are on (0-255)."""
+        return int((self._light_rate * 255) / 100)
+
+    async def async_turn_on(self, **kwargs):
+        """Turn on every light of the group."""
+        # is_on is True while any member is on, switch the others on too
+        await self.modify_group_state(False)
+        brightness = kwargs.get(ATTR_BRIGHTNESS)
+        if brightness is not None and brightness != self.brightness:
+            await self.set_group_light_rate(round((brightness * 100) / 255))
+
+    async def async_turn_off(self, **kwargs):
+        """Turn off every light of the group."""
+        await self.modify_group_state(True)
@@ -1,3 +1,4 @@
+from dataclasses import dataclass, fields
 from typing import TypedDict
 
 class MarsHydroDevices():
@@ -12,6 +13,7 @@ class MarsHydroDevice(TypedDict, total=False):
     isNetDevice: bool
     productId: int
     id: int
+    groupId: int
     connectStatus: int
     deviceLightRate: int
     localLight: int
@@ -20,4 +22,93 @@ class MarsHydroDevice(TypedDict, total=False):
     humidity: str
     temperature: str
     speed: str
-    deviceVersion: str
\ No newline at end of file
+    deviceVersion: str
+    deviceSerialnum: str
+
+
+# Climate readings the cloud reports while a sensor has no valid value
+INVALID_CLIMATE_VALUES = ("-", "100", "0")
+
+
+def _to_float(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass(slots=True, frozen=True)
+class MarsHydroDeviceState:
+    """Parsed state of one device, built once per fetched payload."""
+
+    id: int
+    device_name: str
+    product_type: str
+    product_id: int | None
+    serial_number: str | None
+    device_version: str
+    group_id: int | None
+    connect_status: bool
+    is_close: bool
+    light_rate: int
+    speed: int | None
+    temperature: float | None
+    temperature_celsius: float | None
+    humidity: float | None
+    # Set while the last fetches failed and the values above are outdated
+    stale: bool = False
+
+    def changed_fields(self, other: "MarsHydroDeviceState | None") -> frozenset[str]:
+        """Return the names of the fields that differ from ``other``."""
+        if other is None:
+            return STATE_FIELDS
+        return frozenset(
+            name for name in STATE_FIELDS if getattr(self, name) != getattr(other, name)
+        )
+
+    @classmethod
+    def from_payload(
+        cls, payload: MarsHydroDevice, previous: "MarsHydroDeviceState | None" = None
+    ) -> "MarsHydroDeviceState":
+        """Validate a raw payload, keeping the previous climate values for
+        readings the sensor reported as invalid."""
+        temperature = None
+        if payload.get("temperature") not in INVALID_CLIMATE_VALUES:
+            temperature = _to_float(payload.get("temperature"))
+        if temperature is None and previous is not None:
+            temperature = previous.temperature
+
+        humidity = None
+        if payload.get("humidity") not in INVALID_CLIMATE_VALUES:
+            humidity = _to_float(payload.get("humidity"))
+        if humidity is None and previous is not None:
+            humidity = previous.humidity
+
+        return cls(
+            id=int(payload["id"]),
+            device_name=payload.get("deviceName", ""),
+            product_type=payload.get("productType", ""),
+            product_id=payload.get("productId"),
+            serial_number=payload.get("deviceSerialnum"),
+            device_version=str(payload.get("deviceVersion")),
+            group_id=payload.get("groupId") or None,
+            connect_status=bool(payload.get("connectStatus")),
+            is_close=bool(payload.get("isClose")),
+            light_rate=_to_int(payload.get("deviceLightRate")) or 0,
+            speed=_to_int(payload.get("speed")),
+            temperature=temperature,
+            temperature_celsius=(
+                None if temperature is None else round((temperature - 32) * 5 / 9, 1)
+            ),
+            humidity=humidity,
+        )
+
+
+STATE_FIELDS = frozenset(field.name for field in fields(MarsHydroDeviceState))
@@ -0,0 +1,130 @@
+"""Account-wide request budget and scheduling for the Mars Hydro cloud API."""
+
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+import asyncio
+import heapq
+import itertools
+import time
+
+# Lower values are served first when requests have to wait
+PRIORITY_COMMAND = 0
+PRIORITY_VERIFY = 1
+PRIORITY_POLL = 2
+
+
+class RateLimiter:
+    """Token bucket shared by every request of one account.
+
+    Allows ``rate`` requests per second on average with bursts of up to
+    ``burst``. While callers wait for tokens they are served by priority,
+    then in arrival order, so user commands overtake background polling.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self._rate = rate
+        self._capacity = max(burst, 1)
+        self._tokens = float(self._capacity)
+        self._updated = time.monotonic()
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wakeup: asyncio.TimerHandle | None = None
+
+    async def async_acquire(self, priority: int = PRIORITY_POLL) -> None:
+        """Wait until the budget allows one more request."""
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._schedule_wakeup()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The token was granted after all, hand it to the next waiter
+                self._tokens += 1
+                self._release_waiters()
+            raise
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self._capacity, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
+
+    def _release_waiters(self) -> None:
+        self._wakeup = None
+        self._refill()
+        while self._waiters and self._tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+        self._schedule_wakeup()
+
+    def _schedule_wakeup(self) -> None:
+        if self._wakeup is not None or not self._waiters:
+            return
+        delay = max((1 - self._tokens) / self._rate, 0)
+        self._wakeup = asyncio.get_running_loop().call_later(
+            delay, self._release_waiters
+        )
+
+
+class RequestScheduler:
+    """Run the requests of one account in priority order.
+
+    At most ``max_in_flight`` requests run at once. Queued requests start by
+    priority class (commands, then post-command verification, then routine
+    polling) and in arrival order within a class, and each takes a token
+    from ``rate_limiter`` at the same priority before it is sent.
+    """
+
+    def __init__(self, max_in_flight: int, rate_limiter: RateLimiter) -> None:
+        self._max_in_flight = max(max_in_flight, 1)
+        self._rate_limiter = rate_limiter
+        self._in_flight = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    @asynccontextmanager
+    async def async_slot(self, priority: int = PRIORITY_POLL) -> AsyncIterator[None]:
+        """Hold a request slot for the duration of the block."""
+        await self._async_acquire_slot(priority)
+        try:
+            await self._rate_limiter.async_acquire(priority)
+            yield
+        finally:
+            self._release_slot()
+
+    async def _async_acquire_slot(self, priority: int) -> None:
+        if self._in_flight < self._max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (priority, next(self._sequence), future)
+        heapq.heappush(self._waiters, waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release_slot()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+            raise
+
+    def _release_slot(self) -> None:
+        self._in_flight -= 1
+        while self._waiters and self._in_flight < self._max_in_flight:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._in_flight += 1
+            future.set_result(None)
@@ -0,0 +1,97 @@
+"""Retry and circuit breaker helpers for the Mars Hydro cloud API."""
+
+from datetime import timedelta
+import logging
+import random
+import time
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+
+class RetryPolicy:
+    """How often and how fast a class of requests is retried.
+
+    Transport errors before a response arrives are always retryable. Timeouts
+    are only retried when ``retry_timeouts`` is set, because the server may
+    already have applied a timed out request.
+    """
+
+    def __init__(
+        self,
+        attempts: int,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        retry_timeouts: bool = True,
+    ) -> None:
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_timeouts = retry_timeouts
+
+    def backoff(self, attempt: int) -> float:
+        """Return a full-jitter delay before retrying after ``attempt``."""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+
+# Reads have no side effects and can always be repeated.
+READ_POLICY = RetryPolicy(attempts=3)
+# Commands only retry when the request cannot have been applied.
+COMMAND_POLICY = RetryPolicy(attempts=2, retry_timeouts=False)
+
+
+class CircuitBreaker:
+    """Fail fast while the cloud is down.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    rejects requests for ``reset_timeout``. Then a single probe is let
+    through; its success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: timedelta = timedelta(seconds=30),
+    ) -> None:
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout.total_seconds()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probe_started: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow_request(self) -> bool:
+        if self._opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self._opened_at < self._reset_timeout:
+            return False
+        # A probe that never reported back does not block forever.
+        if (
+            self._probe_started is not None
+            and now - self._probe_started < self._reset_timeout
+        ):
+            return False
+        self._probe_started = now
+        return True
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            _LOGGER.info("Mars Hydro cloud reachable again, closing circuit")
+        self._failures = 0
+        self._opened_at = None
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probe_started = None
+        if self._opened_at is not None or self._failures >= self._failure_threshold:
+            if self._opened_at is None:
+                _LOGGER.warning(
+                    "Mars Hydro cloud failed %d times in a row, pausing requests",
+                    self._failures,
+                )
+            self._opened_at = time.monotonic()
@@ -0,0 +1,152 @@
+"""Per-device poll scheduling for the Mars Hydro coordinator."""
+
+from datetime import timedelta
+import math
+import time
+import zlib
+
+# How long a device keeps the fastest interval after a command or a change
+FAST_POLL_WINDOW = timedelta(minutes=2)
+# Growth factor of the interval while a device stays unchanged
+BACKOFF_FACTOR = 2
+# Checks for due devices per shortest interval, fetches are spread over them
+STAGGER_SLOTS = 5
+MIN_TICK = timedelta(seconds=1)
+
+
+def poll_phase(device_id) -> float:
+    """Return the stable offset of a device within its interval, in [0, 1)."""
+    return zlib.crc32(str(device_id).encode()) / 2**32
+
+
+class AdaptivePollScheduler:
+    """Decide which devices are due for a detail fetch.
+
+    Each device belongs to a tier (its product type) with its own base
+    interval from ``tiers``, clamped to ``min_interval`` and
+    ``max_interval``. Devices of other tiers use ``min_interval``. For a
+    short window after a command or an observed change a device polls at
+    ``min_interval``. While its payload stays the same the interval grows
+    by ``BACKOFF_FACTOR`` from its base interval up to ``max_interval``.
+
+    Routine polls land on a per-device phase of the interval, derived from
+    the device id, so the devices of an account trickle in across the
+    interval instead of being fetched in one burst.
+    """
+
+    def __init__(
+        self,
+        min_interval: timedelta,
+        max_interval: timedelta,
+        fast_window: timedelta = FAST_POLL_WINDOW,
+        tiers: dict[str, timedelta] | None = None,
+    ) -> None:
+        self._min_interval = min_interval.total_seconds()
+        self._max_interval = max(max_interval.total_seconds(), self._min_interval)
+        self._tiers = {
+            tier: min(
+                max(interval.total_seconds(), self._min_interval), self._max_interval
+            )
+            for tier, interval in (tiers or {}).items()
+        }
+        self._fast_window = fast_window.total_seconds()
+        self._device_tier: dict[int, str] = {}
+        self._interval: dict[int, float] = {}
+        self._next_poll: dict[int, float] = {}
+        self._fast_until: dict[int, float] = {}
+        self._failures: dict[int, int] = {}
+
+    @property
+    def tick(self) -> timedelta:
+        """Return how often the coordinator should look for due devices."""
+        shortest = min(self._min_interval, *self._tiers.values())
+        return max(timedelta(seconds=shortest / STAGGER_SLOTS), MIN_TICK)
+
+    def assign(self, device_id, tier) -> None:
+        """Put a device into the tier its base interval is taken from."""
+        self._device_tier[device_id] = tier
+
+    def due(self, device_ids, now: float | None = None) -> list[int]:
+        """Return the ids that should be fetched now."""
+        now = time.monotonic() if now is None else now
+        return [
+            dev_id for dev_id in device_ids if self._next_poll.get(dev_id, 0) <= now
+        ]
+
+    def interval(self, device_id) -> float:
+        return self._interval.get(device_id, self._base_interval(device_id))
+
+    def _base_interval(self, device_id) -> float:
+        return self._tiers.get(self._device_tier.get(device_id), self._min_interval)
+
+    def _fast_interval(self, device_id) -> float:
+        return self._min_interval
+
+    def _next_poll_at(self, device_id, now: float, interval: float) -> float:
+        """Return the first phase slot of a device at least half an interval
+        after ``now``, so it polls every ``interval`` on average.
+
+        Slots are laid out on the wall clock so they survive restarts and
+        line up across hosts, the result is converted back to the
+        monotonic clock ``now`` is measured on.
+        """
+        wall_now = time.time()
+        offset = poll_phase(device_id) * interval
+        slot = offset + math.ceil((wall_now + interval / 2 - offset) / interval) * interval
+        return now + slot - wall_now
+
+    def record_result(
+        self,
+        device_id,
+        changed: bool,
+        now: float | None = None,
+        offline: bool = False,
+    ) -> None:
+        """Reschedule a device after a fetch.
+
+        Offline devices that did not change back off even inside the fast
+        window, coming back online counts as a change.
+        """
+        now = time.monotonic() if now is None else now
+        self._failures.pop(device_id, None)
+        if changed:
+            self._fast_until[device_id] = now + self._fast_window
+        if changed or (not offline and now < self._fast_until.get(device_id, 0)):
+            interval = self._fast_interval(device_id)
+        else:
+            interval = min(
+                max(
+                    self.interval(device_id) * BACKOFF_FACTOR,
+                    self._base_interval(device_id),
+                ),
+                self._max_interval,
+            )
+        self._interval[device_id] = interval
+        self._next_poll[device_id] = self._next_poll_at(device_id, now, interval)
+
+    def record_failure(self, device_id, now: float | None = None) -> int:
+        """Back a failing device off exponentially, return its failure count."""
+        now = time.monotonic() if now is None else now
+        failures = self._failures.get(device_id, 0) + 1
+        self._failures[device_id] = failures
+        interval = min(
+            self._base_interval(device_id) * BACKOFF_FACTOR ** failures,
+            self._max_interval,
+        )
+        self._interval[device_id] = interval
+        self._next_poll[device_id] = self._next_poll_at(device_id, now, interval)
+        return failures
+
+    def boost(self, device_id, now: float | None = None) -> None:
+        """Poll a device fast again, starting with the next tick."""
+        now = time.monotonic() if now is None else now
+        self._fast_until[device_id] = now + self._fast_window
+        self._interval[device_id] = self._fast_interval(device_id)
+        self._next_poll[device_id] = now
+
+    def forget(self, device_id) -> None:
+        self._device_tier.pop(device_id, None)
+        self._interval.pop(device_id, None)
+        self._next_poll.pop(device_id, None)
+        self._fast_until.pop(device_id, None)
+        self._failures.pop(device_id, None)
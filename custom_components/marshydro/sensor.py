@@ -10,9 +10,10 @@ from homeassistant.components.sensor import (
     SensorStateClass
 )
 from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from .const import SIGNAL_DEVICES_ADDED
 from .entity import MarsHydroEntity
 from . import _LOGGER, DOMAIN
-from datetime import timedelta
 
 
 async def async_setup_entry(hass, entry, async_add_entities):
@@ -20,44 +21,50 @@ async def async_setup_entry(hass, entry, async_add_entities):
     _LOGGER.debug("Mars Hydro fan sensor async_setup_entry called")
     coordinator = hass.data[DOMAIN][entry.entry_id]
     
-    device = coordinator.get_device_by_type("WIND")
-    dev_id = device["id"]
-    fan_temperature_celsius_sensor = MarsHydroFanTemperatureCelsiusSensor(coordinator, dev_id)
-    fan_temperature_sensor = MarsHydroFanTemperatureSensor(coordinator, dev_id)
-    fan_humidity_sensor = MarsHydroFanHumiditySensor(coordinator, dev_id)
-    fan_speed_sensor = MarsHydroFanSpeedSensor(coordinator, dev_id)
-    async_add_entities(
-        [
-                fan_temperature_sensor,
-                fan_temperature_celsius_sensor,
-                fan_humidity_sensor,
-                fan_speed_sensor
-        ], 
-        update_before_add=True
+    @callback
+    def async_add_devices(devices):
+        sensors = []
+        for device in devices:
+            if device["productType"] != "WIND":
+                continue
+            dev_id = device["id"]
+            sensors.extend(
+                [
+                    MarsHydroFanTemperatureSensor(coordinator, dev_id),
+                    MarsHydroFanTemperatureCelsiusSensor(coordinator, dev_id),
+                    MarsHydroFanHumiditySensor(coordinator, dev_id),
+                    MarsHydroFanSpeedSensor(coordinator, dev_id),
+                ]
+            )
+        if sensors:
+            async_add_entities(sensors)
+
+    # The coordinator already holds data for every device, entities
+    # are built from it without fetching again before they are added
+    async_add_devices(coordinator.get_devices_by_type("WIND"))
+    entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, SIGNAL_DEVICES_ADDED.format(entry.entry_id), async_add_devices
+        )
     )
 
 
-PARALLEL_UPDATES = 0
-SCAN_INTERVAL = timedelta(seconds=5)
-
 class MarsHydroSensor(MarsHydroEntity, SensorEntity):
     def __init__(self, coordinator, idx):
         super().__init__(coordinator, idx)
         #_LOGGER.debug(f"MarshydroSensor data in coordinator: {str(coordinator.data)}")
-        self._parent_name = self._coordinator.data[idx]["deviceName"]
+        self._parent_name = self._coordinator.data[idx].device_name
         self._old_value: int = 0
 
     @property
     def state_class(self):
         return SensorStateClass.MEASUREMENT
-    
-    async def async_update(self):
-        """Update the fan temperature sensor state."""
-        await self._coordinator.async_update_device_data(self.idx)
 
 
 class MarsHydroFanTemperatureSensor(MarsHydroSensor):
     """Representation of the Mars Hydro fan temperature sensor."""
+    _state_fields = frozenset({"connect_status", "temperature"})
+
     def __init__(self, coordinator, idx):
         super().__init__(coordinator, idx)
 
@@ -75,10 +82,8 @@ class MarsHydroFanTemperatureSensor(MarsHydroSensor):
     @property
     def native_value(self):
         """Return the fan's temperature."""
-        new_temperature = self._coordinator.data[self.idx]["temperature"]
-        if new_temperature != "-":
-            return float(new_temperature)
-        return 0
+        temperature = self._coordinator.data[self.idx].temperature
+        return 0 if temperature is None else temperature
 
 
     @property
@@ -101,6 +106,8 @@ class MarsHydroFanTemperatureSensor(MarsHydroSensor):
 
 class MarsHydroFanTemperatureCelsiusSensor(MarsHydroSensor):
     """Representation of the Mars Hydro fan temperature sensor in Celsius."""
+    _state_fields = frozenset({"connect_status", "temperature_celsius"})
+
     def __init__(self, coordinator, idx):
         super().__init__(coordinator, idx)
 
@@ -119,10 +126,8 @@ class MarsHydroFanTemperatureCelsiusSensor(MarsHydroSensor):
     @property
     def native_value(self):
         """Return the fan's temperature."""
-        new_temperature = self._coordinator.data[self.idx]["temperature"]
-        if new_temperature != "-":
-            return round((float(new_temperature) - 32) * 5 / 9, 1)
-        return 0
+        temperature = self._coordinator.data[self.idx].temperature_celsius
+        return 0 if temperature is None else temperature
 
     @property
     def native_unit_of_measurement(self):
@@ -144,6 +149,8 @@ class MarsHydroFanTemperatureCelsiusSensor(MarsHydroSensor):
 
 class MarsHydroFanHumiditySensor(MarsHydroSensor):
     """Representation of the Mars Hydro fan humidity sensor."""
+    _state_fields = frozenset({"connect_status", "humidity"})
+
     def __init__(self, coordinator, idx):
         super().__init__(coordinator, idx)
 
@@ -161,10 +168,8 @@ class MarsHydroFanHumiditySensor(MarsHydroSensor):
     @property
     def native_value(self):
         """Return the fan's humidity."""
-        new_humidity = self._coordinator.data[self.idx]["humidity"]
-        if new_humidity != "-" and new_humidity != "100":
-            return float(new_humidity)
-        return 0
+        humidity = self._coordinator.data[self.idx].humidity
+        return 0 if humidity is None else humidity
     
 
     @property
@@ -187,6 +192,8 @@ class MarsHydroFanHumiditySensor(MarsHydroSensor):
 
 class MarsHydroFanSpeedSensor(MarsHydroSensor):
     """Representation of the Mars Hydro fan speed sensor."""
+    _state_fields = frozenset({"connect_status", "speed"})
+
     def __init__(self, coordinator, idx):
         super().__init__(coordinator, idx)
         self.entity_id = f"sensor.ifresh_fan_speed_sensor_{self.idx}"
@@ -201,7 +208,7 @@ class MarsHydroFanSpeedSensor(MarsHydroSensor):
     @property
     def native_value(self):
         """Return the fan's speed."""
-        return self._coordinator.data[self.idx]["speed"]
+        return self._coordinator.data[self.idx].speed
 
     @property
     def native_unit_of_measurement(self):
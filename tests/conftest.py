@@ -0,0 +1,17 @@
+"""Make the integration's modules importable without Home Assistant.
+
+The package ``__init__`` sets up the config entry and needs Home Assistant,
+the API client and its scheduling helpers do not. Registering the package
+directory by hand lets tests import those modules directly.
+"""
+
+from pathlib import Path
+import sys
+import types
+
+PACKAGE_DIR = Path(__file__).resolve().parents[1] / "custom_components" / "marshydro"
+
+if "marshydro" not in sys.modules:
+    package = types.ModuleType("marshydro")
+    package.__path__ = [str(PACKAGE_DIR)]
+    sys.modules["marshydro"] = package
@@ -0,0 +1,265 @@
+"""Request count, priority order and backoff of the API client helpers."""
+
+from datetime import timedelta
+import asyncio
+import math
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("async_timeout")
+
+from marshydro.api import LOGIN_PATH, MarsHydroAPI
+from marshydro.auth import MarsHydroTokenManager
+from marshydro.command_queue import CommandQueue
+from marshydro.rate_limit import (
+    PRIORITY_COMMAND,
+    PRIORITY_POLL,
+    PRIORITY_VERIFY,
+    RateLimiter,
+    RequestScheduler,
+)
+from marshydro.retry import CircuitBreaker, RetryPolicy
+from marshydro.scheduler import AdaptivePollScheduler, poll_phase
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self._body = body
+
+    async def json(self):
+        return self._body
+
+
+class FakeSession:
+    """Answer like the Mars Hydro cloud for an account with a few devices."""
+
+    def __init__(self, device_count=5, page_size=2):
+        self.devices = [
+            {"id": 100 + index, "productType": "LIGHT", "deviceName": f"Light {index}"}
+            for index in range(device_count)
+        ]
+        self.page_size = page_size
+        self.paths = []
+
+    async def post(self, url, headers=None, json=None):
+        path = url.split("/api/android", 1)[1]
+        self.paths.append(path)
+        if path == LOGIN_PATH:
+            return FakeResponse({"code": "000", "data": {"token": "token"}})
+        if path == "/udm/getDeviceList/v1":
+            start = json["currentPage"] * self.page_size
+            page = self.devices[start:start + self.page_size]
+            return FakeResponse(
+                {"code": "000", "data": {"list": page, "total": len(self.devices)}}
+            )
+        if path == "/udm/getDeviceDetail/v1":
+            device = next(d for d in self.devices if d["id"] == json["deviceId"])
+            return FakeResponse({"code": "000", "data": {**device, "connectStatus": 1}})
+        raise AssertionError(f"unexpected request to {path}")
+
+
+def test_startup_request_count():
+    """Startup costs one login, the list pages and one read per device."""
+    session = FakeSession(device_count=5, page_size=2)
+
+    async def run():
+        api = MarsHydroAPI("user", "secret", session)
+        devices = await api.async_get_devices()
+        await asyncio.gather(
+            *[api.async_get_device_data(device["id"]) for device in devices]
+        )
+        api.close()
+        return api, devices
+
+    api, devices = asyncio.run(run())
+
+    pages = math.ceil(len(session.devices) / session.page_size)
+    assert [device["id"] for device in sorted(devices, key=lambda d: d["id"])] == [
+        device["id"] for device in session.devices
+    ]
+    assert session.paths.count(LOGIN_PATH) == 1
+    assert session.paths.count("/udm/getDeviceList/v1") == pages
+    assert session.paths.count("/udm/getDeviceDetail/v1") == len(devices)
+    assert api.request_count == 1 + pages + len(devices)
+
+
+def test_concurrent_reads_of_one_device_share_a_request():
+    session = FakeSession(device_count=1)
+
+    async def run():
+        api = MarsHydroAPI("user", "secret", session)
+        await asyncio.gather(*[api.async_get_device_data(100) for _ in range(3)])
+        api.close()
+        return api
+
+    api = asyncio.run(run())
+
+    assert session.paths.count("/udm/getDeviceDetail/v1") == 1
+    assert api.request_count == 2
+
+
+def test_request_scheduler_serves_queued_requests_by_priority():
+    order = []
+
+    async def run():
+        scheduler = RequestScheduler(1, RateLimiter(1000, 1000))
+
+        async def request(name, priority):
+            async with scheduler.async_slot(priority):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        first = asyncio.create_task(request("running", PRIORITY_POLL))
+        await asyncio.sleep(0)
+        queued = [
+            asyncio.create_task(request("poll", PRIORITY_POLL)),
+            asyncio.create_task(request("verify", PRIORITY_VERIFY)),
+            asyncio.create_task(request("command", PRIORITY_COMMAND)),
+        ]
+        await asyncio.gather(first, *queued)
+
+    asyncio.run(run())
+
+    assert order == ["running", "command", "verify", "poll"]
+
+
+def test_rate_limiter_hands_tokens_to_commands_first():
+    order = []
+
+    async def run():
+        limiter = RateLimiter(rate=50, burst=1)
+        await limiter.async_acquire()
+
+        async def acquire(name, priority):
+            await limiter.async_acquire(priority)
+            order.append(name)
+
+        await asyncio.gather(
+            acquire("poll", PRIORITY_POLL),
+            acquire("command", PRIORITY_COMMAND),
+        )
+
+    asyncio.run(run())
+
+    assert order == ["command", "poll"]
+
+
+def test_poll_scheduler_backs_off_and_clamps_tiers():
+    scheduler = AdaptivePollScheduler(
+        timedelta(seconds=15),
+        timedelta(seconds=120),
+        tiers={"WIND": timedelta(seconds=5), "LIGHT": timedelta(seconds=60)},
+    )
+    scheduler.assign(1, "WIND")
+    scheduler.assign(2, "LIGHT")
+
+    assert scheduler.interval(1) == 15
+    assert scheduler.interval(2) == 60
+
+    scheduler.record_result(2, changed=True, now=0)
+    assert scheduler.interval(2) == 15
+    scheduler.record_result(2, changed=False, now=1000)
+    assert scheduler.interval(2) == 60
+    scheduler.record_result(2, changed=False, now=2000)
+    assert scheduler.interval(2) == 120
+    scheduler.record_result(2, changed=False, now=3000)
+    assert scheduler.interval(2) == 120
+
+    assert scheduler.record_failure(1, now=0) == 1
+    assert scheduler.interval(1) == 30
+    assert scheduler.record_failure(1, now=0) == 2
+    assert scheduler.interval(1) == 60
+
+
+def test_poll_scheduler_spreads_devices_over_their_phase():
+    scheduler = AdaptivePollScheduler(timedelta(seconds=60), timedelta(seconds=60))
+    scheduler.record_result(7, changed=False, now=0)
+
+    assert 0 <= poll_phase(7) < 1
+    assert poll_phase(7) == poll_phase(7)
+    assert scheduler.due([7], now=29) == []
+    assert scheduler.due([7], now=91) == [7]
+
+
+def test_command_queue_sends_only_the_last_command():
+    sent = []
+
+    async def command(value):
+        sent.append(value)
+        return value
+
+    async def run():
+        queue = CommandQueue(delay=timedelta(0))
+        return await asyncio.gather(
+            *[queue.async_submit(1, command, value) for value in (10, 20, 30)]
+        )
+
+    results = asyncio.run(run())
+
+    assert sent == [30]
+    assert results == [30, 30, 30]
+
+
+def test_command_queue_close_cancels_waiting_callers():
+    async def command():
+        await asyncio.sleep(10)
+
+    async def run():
+        queue = CommandQueue(delay=timedelta(seconds=10))
+        caller = asyncio.create_task(queue.async_submit(1, command))
+        await asyncio.sleep(0)
+        queue.close()
+        await asyncio.sleep(0)
+        return caller
+
+    caller = asyncio.run(run())
+
+    assert caller.cancelled()
+
+
+def test_retry_backoff_stays_under_the_ceiling():
+    policy = RetryPolicy(attempts=5, base_delay=0.5, max_delay=2)
+
+    for attempt in range(1, 6):
+        ceiling = min(2, 0.5 * 2 ** (attempt - 1))
+        assert all(0 <= policy.backoff(attempt) <= ceiling for _ in range(50))
+
+
+def test_circuit_breaker_opens_and_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=timedelta(0))
+
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert not breaker.is_open
+
+
+def test_token_manager_shares_one_login():
+    logins = []
+
+    async def login():
+        logins.append(1)
+        await asyncio.sleep(0)
+        return f"token-{len(logins)}"
+
+    async def run():
+        manager = MarsHydroTokenManager(login)
+        tokens = await asyncio.gather(*[manager.async_get_token() for _ in range(3)])
+        stale = tokens[0]
+        refreshed = await asyncio.gather(
+            manager.async_refresh(stale_token=stale),
+            manager.async_refresh(stale_token=stale),
+        )
+        manager.close()
+        return tokens, refreshed
+
+    tokens, refreshed = asyncio.run(run())
+
+    assert tokens == ["token-1"] * 3
+    assert refreshed == ["token-2"] * 2
+    assert len(logins) == 2